@@ -0,0 +1,478 @@
+"""
+Helpers used by the view classes to manage their context caches.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
+from django.utils import simplejson, translation
+from django.utils.encoding import smart_str
+
+
+class CacheStats(object):
+    """
+    Thread-safe counters, grouped by view name, that describe how the context
+    cache is behaving in the current process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def incr(self, view_name, counter, delta=1):
+        self.lock.acquire()
+        try:
+            counters = self.counters.setdefault(view_name, {})
+            counters[counter] = counters.get(counter, 0) + delta
+        finally:
+            self.lock.release()
+
+    def maximum(self, view_name, counter, value):
+        """Raise a counter to the value, if it is lower."""
+        self.lock.acquire()
+        try:
+            counters = self.counters.setdefault(view_name, {})
+            counters[counter] = max(counters.get(counter, value), value)
+        finally:
+            self.lock.release()
+
+    def get(self, view_name=None):
+        """
+        Return a copy of the counters for one view, or for all views if no
+        view name is given.
+        """
+        self.lock.acquire()
+        try:
+            if view_name is not None:
+                return dict(self.counters.get(view_name, {}))
+            return dict((name, dict(counters))
+                        for name, counters in self.counters.items())
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.counters.clear()
+        finally:
+            self.lock.release()
+
+
+cache_stats = CacheStats()
+
+STATS_PREFIX = 'baseviews:stats:'
+STATS_INDEX = STATS_PREFIX + 'index'
+STATS_TIME = 60*60*24 # 1 day
+# Counters that hold the largest value seen, rather than a running total
+MAXIMUM_COUNTERS = ('max_encoded_bytes',)
+
+
+def process_id():
+    return '%s-%d' % (socket.gethostname(), os.getpid())
+
+
+def publish_stats():
+    """
+    Share the ``cache_stats`` of this process, so they can be combined with
+    those of the other processes by ``collect_stats``.  They are written to
+    a file in the ``BASEVIEWS_STATS_DIR`` directory if that setting is
+    given, and stored in the cache otherwise.
+    """
+    stats = cache_stats.get()
+    directory = getattr(settings, 'BASEVIEWS_STATS_DIR', None)
+    if directory:
+        path = os.path.join(directory, '%s.json' % process_id())
+        stats_file = open(path + '.tmp', 'w')
+        try:
+            simplejson.dump(stats, stats_file)
+        finally:
+            stats_file.close()
+        # Renaming is atomic, so readers never see a partly written file
+        os.rename(path + '.tmp', path)
+        return
+
+    key = STATS_PREFIX + process_id()
+    cache.set(key, stats, STATS_TIME)
+    # Two processes updating the index at once may lose one of the keys,
+    # but it is added back the next time that process publishes.
+    index = cache.get(STATS_INDEX) or []
+    if key not in index:
+        cache.set(STATS_INDEX, index + [key], STATS_TIME)
+
+
+def collect_stats():
+    """
+    Return the combined ``cache_stats`` published by every process,
+    grouped by view name.
+    """
+    directory = getattr(settings, 'BASEVIEWS_STATS_DIR', None)
+    snapshots = []
+    if directory:
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                stats_file = open(os.path.join(directory, filename))
+                try:
+                    snapshots.append(simplejson.load(stats_file))
+                except ValueError:
+                    continue
+                finally:
+                    stats_file.close()
+    else:
+        snapshots = cache.get_many(cache.get(STATS_INDEX) or []).values()
+
+    combined = {}
+    for snapshot in snapshots:
+        for name, counters in snapshot.items():
+            totals = combined.setdefault(name, {})
+            for counter, value in counters.items():
+                if counter in MAXIMUM_COUNTERS:
+                    totals[counter] = max(totals.get(counter, value), value)
+                else:
+                    totals[counter] = totals.get(counter, 0) + value
+    return combined
+
+
+def clear_published_stats():
+    """Remove the statistics published by every process."""
+    directory = getattr(settings, 'BASEVIEWS_STATS_DIR', None)
+    if directory:
+        for filename in os.listdir(directory):
+            if filename.endswith('.json'):
+                os.remove(os.path.join(directory, filename))
+    else:
+        for key in cache.get(STATS_INDEX) or []:
+            cache.delete(key)
+        cache.delete(STATS_INDEX)
+
+
+_next_publish = [0]
+
+
+def publish_when_due(sender, **kwargs):
+    """
+    Publish the ``cache_stats`` at the end of a request, at most once every
+    ``BASEVIEWS_STATS_INTERVAL`` seconds.
+    """
+    interval = getattr(settings, 'BASEVIEWS_STATS_INTERVAL', None)
+    now = time.time()
+    if interval is None or now < _next_publish[0]:
+        return
+    _next_publish[0] = now + interval
+    publish_stats()
+
+request_finished.connect(publish_when_due,
+                         dispatch_uid='baseviews.publish_when_due')
+
+
+def view_name(view_class):
+    """Return the dotted path used to identify a view class."""
+    return '%s.%s' % (view_class.__module__, view_class.__name__)
+
+
+class LocalCache(object):
+    """
+    A small, thread-safe cache kept in process memory.  It holds at most
+    ``max_entries`` values, evicting the least recently used one first, and
+    every value expires after the timeout given when it was set, unless the
+    timeout is None.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                return None
+            # Re-inserting the entry marks it as the most recently used
+            self.entries[key] = entry
+            return value
+        finally:
+            self.lock.release()
+
+    def set(self, key, value, timeout):
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+            if timeout is not None:
+                timeout += time.time()
+            self.entries[key] = (value, timeout)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def delete(self, key):
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+        finally:
+            self.lock.release()
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key, so that the function is run
+    by only one thread and the others wait for and share its result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        """
+        Call ``func`` unless a call for ``key`` is already in progress.
+        Returns a ``(result, shared)`` tuple, where ``shared`` is True if the
+        result came from another thread's call.
+        """
+        self.lock.acquire()
+        try:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        finally:
+            self.lock.release()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self.lock.acquire()
+            try:
+                del self.calls[key]
+            finally:
+                self.lock.release()
+            call.done.set()
+        return call.result, False
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+local_flights = SingleFlight()
+_class_caches_lock = threading.Lock()
+
+
+def get_class_cache(view_class, name, factory):
+    """
+    Return the cache object stored in the named attribute of a view class,
+    calling ``factory`` to create it the first time it is needed.  Each class
+    gets its own object, even if a parent class already has one.
+    """
+    class_cache = view_class.__dict__.get(name)
+    if class_cache is None:
+        _class_caches_lock.acquire()
+        try:
+            class_cache = view_class.__dict__.get(name)
+            if class_cache is None:
+                class_cache = factory()
+                setattr(view_class, name, class_cache)
+        finally:
+            _class_caches_lock.release()
+    return class_cache
+
+
+def get_local_cache(view_class):
+    """
+    Return the in-process context cache for a view class, sized by its
+    ``local_cache_size`` attribute.
+    """
+    return get_class_cache(view_class, '_local_cache',
+                           lambda: LocalCache(view_class.local_cache_size))
+
+
+TAG_PREFIX = 'baseviews:tag:'
+TAG_TIME = 60*60*24*30 # 30 days, the longest relative time memcached allows
+
+
+def new_tag_version():
+    return uuid.uuid4().hex[:12]
+
+
+def get_tag_version(tags):
+    """
+    Return a short token made from the current versions of the tags, which
+    changes whenever any of the tags is invalidated.  Tags that don't have a
+    version yet are given one.
+    """
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_tag_version(), TAG_TIME)
+        # Another process may have added a version first, so use theirs.
+        versions.update(cache.get_many(missing))
+    token = ':'.join([versions.get(key, '') for key in keys])
+    return hashlib.md5(token).hexdigest()[:12]
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidate every cached context tagged with any of the tags, by giving
+    the tags new versions.  Nothing needs to be deleted, since the cache keys
+    that use the old versions will never be looked up again.
+    """
+    cache.set_many(dict((TAG_PREFIX + tag, new_tag_version())
+                        for tag in tags), TAG_TIME)
+
+
+def model_tag(model):
+    """
+    Return the cache tag for a model class, or for an ``"app_label.Model"``
+    string.
+    """
+    if isinstance(model, basestring):
+        return 'model:%s' % model.lower()
+    return 'model:%s.%s' % (model._meta.app_label,
+                            model._meta.object_name.lower())
+
+
+watched_tags = set()
+
+
+def watch_models(models):
+    """
+    Invalidate the cache tags of the models whenever an instance of one of
+    them is saved or deleted.
+    """
+    for model in models:
+        watched_tags.add(model_tag(model))
+
+
+def invalidate_model(sender, **kwargs):
+    tag = model_tag(sender)
+    if tag in watched_tags:
+        invalidate_tags(tag)
+
+post_save.connect(invalidate_model, dispatch_uid='baseviews.invalidate_model')
+post_delete.connect(invalidate_model,
+                    dispatch_uid='baseviews.invalidate_model')
+
+
+def vary_on_path(view):
+    return smart_str(view.request.path)
+
+
+def vary_on_args(view):
+    return '/'.join([smart_str(arg) for arg in view.args])
+
+
+def vary_on_kwargs(view):
+    return '&'.join(['%s=%s' % (smart_str(key), smart_str(value))
+                     for key, value in sorted(view.kwargs.items())])
+
+
+def vary_on_query(view):
+    return '&'.join(['%s=%s' % (smart_str(key),
+                                ','.join([smart_str(value)
+                                          for value in values]))
+                     for key, values in sorted(view.request.GET.lists())])
+
+
+def vary_on_user(view):
+    user = getattr(view.request, 'user', None)
+    if user is None or not user.is_authenticated():
+        return 'anonymous'
+    return str(user.pk)
+
+
+def vary_on_auth(view):
+    user = getattr(view.request, 'user', None)
+    return str(user is not None and user.is_authenticated())
+
+
+def vary_on_language(view):
+    return smart_str(getattr(view.request, 'LANGUAGE_CODE', None) or
+                     translation.get_language())
+
+
+VARY_ON = {
+    'path': vary_on_path,
+    'args': vary_on_args,
+    'kwargs': vary_on_kwargs,
+    'get': vary_on_query,
+    'user': vary_on_user,
+    'auth': vary_on_auth,
+    'language': vary_on_language,
+}
+
+
+def compile_vary_on(vary_on):
+    """
+    Turn a ``vary_on`` specification into a list of functions that each
+    take a view and return one part of its cache key.
+    """
+    functions = []
+    for item in vary_on:
+        kind, sep, name = item.partition(':')
+        if not name and kind in VARY_ON:
+            functions.append(VARY_ON[kind])
+        elif name and kind == 'kwarg':
+            functions.append(
+                lambda view, name=name: smart_str(view.kwargs.get(name, '')))
+        elif name and kind == 'get':
+            functions.append(
+                lambda view, name=name: ','.join(
+                    [smart_str(value)
+                     for value in view.request.GET.getlist(name)]))
+        elif name and kind == 'header':
+            meta_key = 'HTTP_%s' % name.upper().replace('-', '_')
+            functions.append(
+                lambda view, meta_key=meta_key: smart_str(
+                    view.request.META.get(meta_key, '')))
+        else:
+            raise ImproperlyConfigured('Unknown vary_on value: %r' % item)
+    return functions
+
+
+def vary_cache_key(prefix, values):
+    """
+    Build a cache key from a prefix and the values the cache varies on.  The
+    values are hashed, so the key stays short and safe for memcached however
+    long they are.  Unicode values are encoded as UTF-8 first.
+    """
+    digest = hashlib.md5('\x00'.join([smart_str(value)
+                                      for value in values])).hexdigest()
+    prefix = smart_str(prefix)
+    if len(prefix) > 200 or len(prefix.split()) != 1:
+        prefix = hashlib.md5(prefix).hexdigest()
+    return '%s:%s' % (prefix, digest)
@@ -0,0 +1,74 @@
+"""
+Codecs used to encode view contexts before they are stored in the cache.
+"""
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+RAW = 'r'
+COMPRESSED = 'z'
+
+
+class PickleCodec(object):
+    """
+    Pickles values with the highest protocol available, which is far more
+    compact and faster to load than the text protocol most cache backends
+    use.  Values that pickle to at least ``compress_threshold`` bytes are
+    compressed with zlib, and a one byte prefix records which was done.
+    """
+    compress_threshold = None # Set to compress values of at least this size
+    compress_level = 6
+
+    def encode(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self.compress_threshold is not None and \
+                len(data) >= self.compress_threshold:
+            return COMPRESSED + zlib.compress(data, self.compress_level)
+        return RAW + data
+
+    def decode(self, data):
+        flag, data = data[:1], data[1:]
+        if flag == COMPRESSED:
+            data = zlib.decompress(data)
+        elif flag != RAW:
+            raise ValueError('Unknown context encoding: %r' % flag)
+        return pickle.loads(data)
+
+
+class CompressedPickleCodec(PickleCodec):
+    """Compresses pickled values of 1KB or more."""
+    compress_threshold = 1024
+
+
+_codecs = {}
+
+
+def get_codec(path=None):
+    """
+    Return an instance of the codec class at the given dotted path,
+    defaulting to the ``BASEVIEWS_CONTEXT_CODEC`` setting.  Returns None if
+    neither is set, in which case contexts are given to the cache as they
+    are.  Instances are shared, so codecs must be safe to use from several
+    threads.
+    """
+    if path is None:
+        path = getattr(settings, 'BASEVIEWS_CONTEXT_CODEC', None)
+        if path is None:
+            return None
+    codec = _codecs.get(path)
+    if codec is None:
+        module_name, class_name = path.rsplit('.', 1)
+        try:
+            codec_class = getattr(import_module(module_name), class_name)
+        except (ImportError, AttributeError) as e:
+            raise ImproperlyConfigured('Error importing codec %s: "%s"'
+                                       % (path, e))
+        codec = _codecs[path] = codec_class()
+    return codec
@@ -0,0 +1,66 @@
+"""
+Helpers for running independent pieces of view work at the same time.
+"""
+import sys
+import threading
+
+from django.db import connections
+from django.utils import translation
+
+# The three argument raise re-raises an exception with its original
+# traceback.  It's compiled at run time, since it isn't valid Python 3.
+exec('def reraise(exc_info):\n'
+     '    raise exc_info[0], exc_info[1], exc_info[2]\n')
+
+
+def run_concurrently(funcs, max_workers):
+    """
+    Call each of the functions using up to ``max_workers`` threads, and
+    return their results in the same order as the functions.  If any of the
+    calls raise an exception, the first one is re-raised, with its
+    traceback, after all of the calls have finished.  The threads use the
+    caller's active language.
+    """
+    funcs = list(funcs)
+    if max_workers <= 1 or len(funcs) <= 1:
+        return [func() for func in funcs]
+
+    results = [None] * len(funcs)
+    errors = [None] * len(funcs)
+    pending = iter(range(len(funcs)))
+    lock = threading.Lock()
+    language = translation.get_language()
+
+    def worker():
+        translation.activate(language)
+        try:
+            while True:
+                lock.acquire()
+                try:
+                    index = next(pending, None)
+                finally:
+                    lock.release()
+                if index is None:
+                    return
+                try:
+                    results[index] = funcs[index]()
+                except Exception:
+                    errors[index] = sys.exc_info()
+        finally:
+            translation.deactivate()
+            # Each thread gets its own database connections, which would
+            # otherwise be left open when the thread exits.
+            for connection in connections.all():
+                connection.close()
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(max_workers, len(funcs)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            reraise(error)
+    return results
@@ -0,0 +1,72 @@
+"""
+Lazily evaluated context values.
+"""
+from django.template import Context, RequestContext
+
+# Returned by cached_context to mean that there is nothing to show
+EMPTY = 'baseviews:empty'
+
+
+class LazyValue(object):
+    """
+    A context value that isn't computed until it is first used by the
+    template or serializer, and then only once.  The function is called with
+    any extra arguments that are given.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.evaluated = False
+        self.value = None
+
+    def __call__(self):
+        if not self.evaluated:
+            self.value = self.func(*self.args, **self.kwargs)
+            self.evaluated = True
+            # Release anything the function was holding on to
+            self.func = self.args = self.kwargs = None
+        return self.value
+
+    def __repr__(self):
+        if self.evaluated:
+            return '<LazyValue: %r>' % (self.value,)
+        return '<LazyValue: not evaluated>'
+
+
+def resolve_lazy(context_dict):
+    """
+    Evaluate the lazy values in a context dict, replacing them with their
+    values, and return the dict.
+    """
+    for key, value in context_dict.items():
+        if isinstance(value, LazyValue):
+            context_dict[key] = value()
+    return context_dict
+
+
+class LazyContext(Context):
+    """
+    A ``Context`` that evaluates lazy values when the template looks them
+    up.
+    """
+
+    def __getitem__(self, key):
+        value = super(LazyContext, self).__getitem__(key)
+        if isinstance(value, LazyValue):
+            return value()
+        return value
+
+    def get(self, key, otherwise=None):
+        value = super(LazyContext, self).get(key, otherwise)
+        if isinstance(value, LazyValue):
+            return value()
+        return value
+
+
+class LazyRequestContext(LazyContext, RequestContext):
+    """
+    A ``RequestContext`` that evaluates lazy values when the template looks
+    them up.
+    """
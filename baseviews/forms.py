@@ -0,0 +1,60 @@
+"""
+Caching of the HTML of unbound forms.
+"""
+from django.core.cache import cache
+from django.utils.encoding import smart_str
+from django.utils.safestring import mark_safe
+
+
+class CachedFormHTML(object):
+    """
+    Stands in for an unbound form in the template context.  Rendering it with
+    ``{{ form }}``, ``as_table``, ``as_p`` or ``as_ul`` uses HTML from the
+    cache, and the form itself is only built if its HTML isn't cached yet or
+    anything else about it is used.
+    """
+
+    def __init__(self, form_class, options, cache_key, cache_time):
+        self.form_class = form_class
+        self.options = dict(options)
+        self.cache_key = cache_key
+        self.cache_time = cache_time
+        self._form = None
+
+    @property
+    def form(self):
+        if self._form is None:
+            self._form = self.form_class(**self.options)
+        return self._form
+
+    def render(self, method):
+        key = '%s:%s' % (self.cache_key, method)
+        html = cache.get(key)
+        if html is None:
+            html = getattr(self.form, method)()
+            cache.set(key, html, self.cache_time)
+        return mark_safe(html)
+
+    def as_table(self):
+        return self.render('as_table')
+
+    def as_p(self):
+        return self.render('as_p')
+
+    def as_ul(self):
+        return self.render('as_ul')
+
+    def __unicode__(self):
+        return self.as_table()
+
+    def __str__(self):
+        return smart_str(self.as_table())
+
+    def __getattr__(self, name):
+        return getattr(self.form, name)
+
+    def __getitem__(self, name):
+        return self.form[name]
+
+    def __iter__(self):
+        return iter(self.form)
@@ -0,0 +1,131 @@
+"""
+Timing of the phases of the view workflow.
+"""
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.importlib import import_module
+
+
+class Timings(object):
+    """The phases of one request to a view, in the order they finished."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = []
+
+    def phase(self, name, **info):
+        return Phase(self, name, info)
+
+    def total(self):
+        return time.time() - self.start
+
+    def server_timing(self):
+        """Describe the phases in the format of a Server-Timing header."""
+        metrics = []
+        for phase in self.phases:
+            metric = phase.name
+            if 'hit' in phase.info:
+                outcome = phase.info['hit'] and 'hit' or 'miss'
+                metric += ';desc="%s"' % outcome
+            metrics.append('%s;dur=%.3f' % (metric, phase.duration * 1000))
+        metrics.append('total;dur=%.3f' % (self.total() * 1000))
+        return ', '.join(metrics)
+
+
+class Phase(object):
+    """
+    Times the block of a ``with`` statement.  Extra details, such as whether
+    a cache lookup hit, can be added to the ``info`` dict.
+    """
+
+    def __init__(self, timings, name, info):
+        self.timings = timings
+        self.name = name
+        self.info = info
+        self.duration = None
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.time() - self.started
+        self.timings.phases.append(self)
+        return False
+
+
+class NullPhase(object):
+    """
+    Stands in for ``Phase`` when a view isn't instrumented.  One instance is
+    shared by every thread, so each use of ``info`` gets a new dict, and
+    anything added to it is thrown away.
+    """
+
+    @property
+    def info(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+null_phase = NullPhase()
+
+
+class QueryCounter(object):
+    """
+    Counts the queries made on a database connection in the block of a
+    ``with`` statement.  The connection's debug cursor is switched on while
+    counting, so queries are recorded even when ``DEBUG`` is off.
+    """
+
+    def __init__(self, using=None):
+        self.connection = connections[using or DEFAULT_DB_ALIAS]
+        self.count = None
+
+    def __enter__(self):
+        connection = self.connection
+        self.use_debug_cursor = getattr(connection, 'use_debug_cursor', None)
+        connection.use_debug_cursor = True
+        if not hasattr(connection.__class__, 'use_debug_cursor'):
+            # Django 1.2 only records queries when DEBUG is on, so make its
+            # cursors debug cursors directly.
+            connection.cursor = lambda: connection.make_debug_cursor(
+                connection._cursor())
+        self.start = len(connection.queries)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.count = len(self.connection.queries) - self.start
+        self.connection.use_debug_cursor = self.use_debug_cursor
+        if 'cursor' in self.connection.__dict__:
+            del self.connection.cursor
+        return False
+
+
+_collectors = None
+
+
+def get_collectors():
+    """
+    Return the callables named by the ``BASEVIEWS_TIMING_COLLECTORS``
+    setting.  Each is called with the view, its timings and the response.
+    """
+    global _collectors
+    if _collectors is None:
+        collectors = []
+        for path in getattr(settings, 'BASEVIEWS_TIMING_COLLECTORS', ()):
+            module_name, attr = path.rsplit('.', 1)
+            try:
+                collectors.append(getattr(import_module(module_name), attr))
+            except (ImportError, AttributeError) as e:
+                raise ImproperlyConfigured(
+                    'Error importing timing collector %s: "%s"' % (path, e))
+        _collectors = collectors
+    return _collectors
@@ -0,0 +1,90 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from baseviews.caching import clear_published_stats, collect_stats
+
+SORT_KEYS = {
+    'cost': lambda row: -row['generation_time'],
+    'hit-ratio': lambda row: row['hit_ratio'],
+    'misses': lambda row: -row['misses'],
+    'bytes': lambda row: -(row['average_bytes'] or 0),
+}
+
+
+def summarize(name, counters):
+    """Work out the figures reported for one view from its counters."""
+    hits = counters.get('hits', 0) + counters.get('local_hits', 0)
+    misses = counters.get('misses', 0)
+    lookups = hits + misses
+    generations = counters.get('generations', 0)
+    # Only encoded contexts are measured, so views without a codec have no
+    # size at all rather than a size of 0.
+    encodes = counters.get('encodes', 0)
+    return {
+        'name': name,
+        'lookups': lookups,
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': lookups and float(hits) / lookups or 0.0,
+        'sets': counters.get('sets', 0),
+        'generation_time': counters.get('generation_time', 0.0),
+        'average_generation': generations and
+            counters.get('generation_time', 0.0) / generations or 0.0,
+        'average_bytes': encodes and
+            float(counters.get('encoded_bytes', 0)) / encodes or None,
+    }
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--sort', dest='sort', default='cost',
+            choices=sorted(SORT_KEYS.keys()),
+            help='How to rank the views: "cost" (total time spent '
+                 'generating contexts, the default), "hit-ratio" (lowest '
+                 'first), "misses" or "bytes".'),
+        make_option('--limit', dest='limit', type='int', default=None,
+            help='Only show this many views.'),
+        make_option('--min-lookups', dest='min_lookups', type='int',
+            default=20,
+            help='Flag views with a hit ratio under 50% once they have had '
+                 'this many lookups.'),
+        make_option('--clear', dest='clear', action='store_true',
+            default=False,
+            help='Remove the published statistics after reporting them.'),
+    )
+    help = ('Reports the context cache statistics published by every '
+            'process, ranked to show which views need tuning.')
+
+    def handle(self, *args, **options):
+        stats = collect_stats()
+        if not stats:
+            raise CommandError('No statistics have been published.  Set '
+                               'BASEVIEWS_STATS_INTERVAL to publish them.')
+
+        rows = [summarize(name, counters) for name, counters in stats.items()]
+        rows.sort(key=SORT_KEYS[options['sort']])
+        if options['limit']:
+            rows = rows[:options['limit']]
+
+        self.stdout.write('%-50s %8s %6s %8s %10s %11s %10s\n' % (
+            'view', 'lookups', 'hit %', 'sets', 'avg gen ms', 'total gen s',
+            'avg bytes'))
+        for row in rows:
+            note = ''
+            if row['lookups'] >= options['min_lookups'] and \
+                    row['hit_ratio'] < 0.5:
+                note = '  low hit ratio'
+            if row['average_bytes'] is None:
+                average_bytes = '-'
+            else:
+                average_bytes = '%.0f' % row['average_bytes']
+            self.stdout.write('%-50s %8d %6.1f %8d %10.1f %11.2f %10s%s\n'
+                              % (row['name'][-50:], row['lookups'],
+                                 row['hit_ratio'] * 100, row['sets'],
+                                 row['average_generation'] * 1000,
+                                 row['generation_time'],
+                                 average_bytes, note))
+
+        if options['clear']:
+            clear_published_stats()
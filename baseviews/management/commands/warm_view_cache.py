@@ -0,0 +1,181 @@
+import time
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.backends import locmem
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import (NoReverseMatch, RegexURLResolver,
+                                      get_resolver, reverse)
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.utils import simplejson
+from django.utils.importlib import import_module
+
+from baseviews.caching import view_name
+from baseviews.views import BasicView
+
+# LocMemCache was called CacheClass before Django 1.3
+LocMemCache = getattr(locmem, 'LocMemCache', locmem.CacheClass)
+
+
+def find_views(patterns):
+    """
+    Yield the URL patterns in the URLconf that map to ``BasicView``
+    subclasses with a context cache, along with their view classes.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, RegexURLResolver):
+            for found in find_views(pattern.url_patterns):
+                yield found
+            continue
+        try:
+            callback = pattern.callback
+        except Exception:
+            # Views that can't be imported can't be warmed either
+            continue
+        if isinstance(callback, type) and issubclass(callback, BasicView) \
+                and (callback.cache_key or callback.context_sections):
+            yield pattern, callback
+
+
+def load_view(path):
+    module_name, class_name = path.rsplit('.', 1)
+    return getattr(import_module(module_name), class_name)
+
+
+def build_request(view_class, args, kwargs, query):
+    request = HttpRequest()
+    request.method = 'GET'
+    try:
+        request.path = reverse(view_class, args=args, kwargs=kwargs)
+    except NoReverseMatch:
+        request.path = '/'
+    request.path_info = request.path
+    request.GET = QueryDict('', mutable=True)
+    for key, value in query.items():
+        request.GET[key] = value
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+                    'REQUEST_METHOD': 'GET'}
+    request.user = AnonymousUser()
+    return request
+
+
+def warm(task):
+    """
+    Warm the cache for one set of URL arguments.  This is a module-level
+    function so that it can be sent to worker processes.
+    """
+    path, args, kwargs, query = task
+    start = time.time()
+    try:
+        view_class = load_view(path)
+        view_class.warm_cache(build_request(view_class, args, kwargs, query),
+                              *args, **kwargs)
+        error = None
+    except Exception as e:
+        error = '%s: %s' % (e.__class__.__name__, e)
+    finally:
+        for connection in connections.all():
+            connection.close()
+    return path, args, kwargs, time.time() - start, error
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--file', dest='file',
+            help='A JSON file mapping view paths to lists of objects with '
+                 '"args", "kwargs" and "get" keys to warm the cache with.'),
+        make_option('--workers', dest='workers', type='int', default=4,
+            help='The number of workers to warm the cache with.'),
+        make_option('--processes', dest='processes', action='store_true',
+            default=False,
+            help='Use worker processes instead of threads.  This needs a '
+                 'cache that is shared between processes.'),
+    )
+    help = ('Fills the context cache of the cacheable views in the URLconf '
+            'ahead of time.')
+    args = '[view_path ...]'
+
+    def handle(self, *view_paths, **options):
+        if options.get('processes') and isinstance(cache, LocMemCache):
+            raise CommandError('--processes can\'t be used with the locmem '
+                               'cache, which isn\'t shared between '
+                               'processes.')
+        argument_sets = {}
+        if options.get('file'):
+            try:
+                argument_sets = simplejson.load(open(options['file']))
+            except (IOError, ValueError) as e:
+                raise CommandError('Unable to read %s: %s'
+                                   % (options['file'], e))
+
+        tasks = []
+        seen = set()
+        for pattern, view_class in find_views(get_resolver(None).url_patterns):
+            path = view_name(view_class)
+            if path in seen or (view_paths and path not in view_paths):
+                continue
+            seen.add(path)
+            tasks.extend(self.get_tasks(path, view_class, pattern,
+                                        argument_sets.get(path)))
+        if not tasks:
+            raise CommandError('There are no views to warm.')
+
+        if options['processes']:
+            pool = Pool(options['workers'])
+        else:
+            pool = ThreadPool(options['workers'])
+
+        totals = {}
+        start = time.time()
+        try:
+            results = pool.imap_unordered(warm, tasks)
+            for count, result in enumerate(results):
+                path, args, kwargs, duration, error = result
+                self.stdout.write('[%d/%d] %s %r %r %.1fms%s\n' % (
+                    count + 1, len(tasks), path, args, kwargs,
+                    duration * 1000, error and ' FAILED %s' % error or ''))
+                total = totals.setdefault(path, [0, 0, 0.0])
+                total[0] += 1
+                total[1] += error is not None
+                total[2] += duration
+        finally:
+            pool.close()
+            pool.join()
+
+        self.stdout.write('\n')
+        for path in sorted(totals):
+            count, failures, duration = totals[path]
+            self.stdout.write('%s: %d warmed, %d failed, %.1fms average\n' %
+                              (path, count - failures, failures,
+                               duration * 1000 / count))
+        self.stdout.write('Warmed %d caches in %.2fs\n' %
+                          (len(tasks), time.time() - start))
+        failures = sum([total[1] for total in totals.values()])
+        if failures:
+            raise CommandError('%d of %d caches failed to warm.'
+                               % (failures, len(tasks)))
+
+    def get_tasks(self, path, view_class, pattern, argument_sets):
+        """
+        Return the tasks for a view.  URL arguments come from the file,
+        then from the view's ``get_warm_cache_args``.  Views whose URL
+        patterns take no arguments are warmed once without any.
+        """
+        if argument_sets is not None:
+            return [(path, tuple(item.get('args', ())),
+                     dict((str(key), value) for key, value
+                          in item.get('kwargs', {}).items()),
+                     item.get('get', {}))
+                    for item in argument_sets]
+        generated = view_class.get_warm_cache_args()
+        if generated is not None:
+            return [(path, tuple(args), kwargs, {})
+                    for args, kwargs in generated]
+        if not pattern.regex.groups:
+            return [(path, (), {}, {})]
+        self.stdout.write('Skipping %s, which needs URL arguments\n' % path)
+        return []
@@ -0,0 +1,83 @@
+"""
+Profiling of individual requests to the views.
+"""
+import hashlib
+import hmac
+import os
+import pstats
+import random
+import time
+import uuid
+from StringIO import StringIO
+
+from django.conf import settings
+
+from baseviews.caching import view_name
+
+PROFILE_HEADER = 'HTTP_X_BASEVIEWS_PROFILE'
+
+
+def profile_signature(path):
+    """
+    Return the value of the ``X-Baseviews-Profile`` header that turns on
+    profiling for a request to the path.  It is signed with the
+    ``SECRET_KEY``, so only people who know it can profile requests.
+    """
+    return hmac.new(settings.SECRET_KEY, 'baseviews.profile:%s' % path,
+                    hashlib.sha1).hexdigest()
+
+
+def signatures_match(a, b):
+    """Compare two signatures in constant time."""
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+def should_profile(view_class, request):
+    """
+    Return True if the request asks to be profiled with a signed header or
+    a parameter given by a staff member, or is picked by sampling, according
+    to the view class's ``profile_*`` attributes.
+    """
+    if view_class.profile_header:
+        signature = request.META.get(PROFILE_HEADER)
+        if signature and signatures_match(
+                signature, profile_signature(request.path)):
+            return True
+    if view_class.profile_param and \
+            request.GET.get(view_class.profile_param):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+    if view_class.profile_sample:
+        return random.random() * view_class.profile_sample < 1
+    return False
+
+
+def save_profile(view, profiler, directory):
+    """
+    Write the profile of a request to the directory, as a ``.prof`` file
+    that can be loaded with ``pstats``, and a ``.txt`` summary listing the
+    view, its phase timings and the most expensive functions.
+    """
+    name = view_name(view.__class__)
+    base = os.path.join(directory, '%s.%d.%s' % (
+        name, int(time.time() * 1000), uuid.uuid4().hex[:6]))
+    profiler.dump_stats(base + '.prof')
+
+    summary = StringIO()
+    summary.write('%s %s %s\n' % (name, view.request.method,
+                                  view.request.path))
+    summary.write('Phases: %s\n\n' % view.timings.server_timing())
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats('cumulative').print_stats(30)
+    summary_file = open(base + '.txt', 'w')
+    try:
+        summary_file.write(summary.getvalue())
+    finally:
+        summary_file.close()
+    return base + '.prof'
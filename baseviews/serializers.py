@@ -0,0 +1,199 @@
+"""
+Serialization of view contexts for the Ajax views.
+"""
+import datetime
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.query import QuerySet
+from django.utils import simplejson
+from django.utils.encoding import force_unicode
+from django.utils.importlib import import_module
+
+from baseviews.context import LazyValue
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Types that ujson encodes the same way as simplejson
+JSON_TYPES = (basestring, bool, int, long, float)
+UJSON_DEFAULT = False # Whether ujson takes a default function
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """
+    Django's JSON encoder, which handles dates, times and decimals, extended
+    to evaluate lazy context values.
+    """
+
+    def default(self, o):
+        if isinstance(o, LazyValue):
+            return o()
+        return super(JSONEncoder, self).default(o)
+
+
+class JSONSerializer(object):
+    """
+    Encodes data with simplejson and the JSON encoder above.
+    """
+
+    def dumps(self, data):
+        return simplejson.dumps(data, cls=JSONEncoder)
+
+
+def prepare_for_ujson(data, encoder):
+    """
+    Return a copy of the data with anything other than dicts, lists, strings,
+    numbers, booleans and None converted by the JSON encoder, for versions
+    of ujson that don't take a ``default`` function.
+    """
+    if isinstance(data, dict):
+        return dict((key, prepare_for_ujson(value, encoder))
+                    for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return [prepare_for_ujson(item, encoder) for item in data]
+    if data is None or isinstance(data, JSON_TYPES):
+        return data
+    return prepare_for_ujson(encoder.default(data), encoder)
+
+
+def ujson_dumps(data, encoder):
+    if UJSON_DEFAULT:
+        return ujson.dumps(data, default=encoder.default)
+    return ujson.dumps(prepare_for_ujson(data, encoder))
+
+
+def check_ujson():
+    """
+    Return True if ujson encodes values the same way as ``JSONSerializer``.
+    Some versions encode dates as timestamps, and decimals, long integers or
+    floats inexactly, and those aren't used.
+    """
+    encoder = JSONEncoder()
+    samples = [
+        {'when': datetime.datetime(2010, 6, 1, 12, 30),
+         'day': datetime.date(2010, 6, 1), 'cost': decimal.Decimal('1.10'),
+         'lazy': LazyValue(unicode, 'haz')},
+        [0.1 + 0.2, 1e-7, 1e300, u'caf\xe9 /lol/', True, None],
+        [10 ** 20],
+    ]
+    for sample in samples:
+        try:
+            encoded = ujson_dumps(sample, encoder)
+        except (TypeError, OverflowError):
+            # Values that ujson refuses are encoded by JSONSerializer
+            continue
+        try:
+            if simplejson.loads(encoded) != \
+                    simplejson.loads(simplejson.dumps(sample, cls=JSONEncoder)):
+                return False
+        except ValueError:
+            return False
+    return True
+
+
+if ujson is not None:
+    try:
+        ujson.dumps(None, default=repr)
+        UJSON_DEFAULT = True
+    except TypeError:
+        pass
+    if not check_ujson():
+        ujson = None
+
+
+class FastJSONSerializer(JSONSerializer):
+    """
+    Encodes data with ujson if it is installed and encodes values the same
+    way as ``JSONSerializer``.  If it isn't, or if the data can't be encoded
+    with it, ``JSONSerializer`` is used instead.
+    """
+
+    def __init__(self):
+        self.encoder = JSONEncoder()
+
+    def dumps(self, data):
+        if ujson is not None:
+            try:
+                return ujson_dumps(data, self.encoder)
+            except (TypeError, OverflowError):
+                pass
+        return super(FastJSONSerializer, self).dumps(data)
+
+
+_serializers = {}
+
+
+def get_serializer(path=None):
+    """
+    Return an instance of the serializer class at the given dotted path,
+    defaulting to the ``BASEVIEWS_SERIALIZER`` setting.  Instances are
+    shared, so serializers must be safe to use from several threads.
+    """
+    if path is None:
+        path = getattr(settings, 'BASEVIEWS_SERIALIZER',
+                       'baseviews.serializers.JSONSerializer')
+    serializer = _serializers.get(path)
+    if serializer is None:
+        module_name, class_name = path.rsplit('.', 1)
+        try:
+            serializer_class = getattr(import_module(module_name), class_name)
+        except (ImportError, AttributeError) as e:
+            raise ImproperlyConfigured('Error importing serializer %s: "%s"'
+                                       % (path, e))
+        serializer = _serializers[path] = serializer_class()
+    return serializer
+
+
+def iter_json(data, encoder=None, chunk_size=8192):
+    """
+    Encode the data as JSON, yielding it in chunks of about ``chunk_size``
+    characters.  Lists, querysets, generators and other iterables are
+    consumed one item at a time rather than being loaded into memory first.
+    """
+    if encoder is None:
+        encoder = JSONEncoder()
+    buffer = []
+    size = 0
+    for piece in iter_json_pieces(data, encoder):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_json_pieces(data, encoder):
+    """Yield the JSON encoding of the data in small pieces."""
+    if isinstance(data, LazyValue):
+        data = data()
+    if isinstance(data, dict):
+        yield '{'
+        for i, (key, value) in enumerate(data.items()):
+            if i:
+                yield ', '
+            yield encoder.encode(force_unicode(key))
+            yield ': '
+            for piece in iter_json_pieces(value, encoder):
+                yield piece
+        yield '}'
+    elif isinstance(data, basestring) or not hasattr(data, '__iter__'):
+        yield encoder.encode(data)
+    else:
+        if isinstance(data, QuerySet):
+            # Avoid filling the queryset's result cache
+            data = data.iterator()
+        yield '['
+        for i, item in enumerate(data):
+            if i:
+                yield ', '
+            for piece in iter_json_pieces(item, encoder):
+                yield piece
+        yield ']'
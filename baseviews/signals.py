@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent after an instrumented view has returned its response
+view_timed = Signal(providing_args=['view', 'timings', 'response'])
+
+# Sent after a request to a view has been profiled
+view_profiled = Signal(providing_args=['view', 'profiler', 'response'])
+
+# Sent after a MultiFormView has saved its forms
+forms_saved = Signal(providing_args=['view', 'queries'])
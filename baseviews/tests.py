@@ -1,7 +1,10 @@
+import time
 import unittest
 from django.conf import settings
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, Client
 from django.utils import simplejson
+from baseviews.caching import vary_cache_key
 from baseviews.views import BasicView
 
 
@@ -25,6 +28,575 @@ class BaseviewTests(TestCase):
         self.assertEqual(response['Content-Type'],
                          settings.DEFAULT_CONTENT_TYPE)
 
+    def test_stale_context(self):
+        from baseviews.caching import cache_stats
+        view_name = 'test_project.views.StaleCheezburger'
+        cache_stats.reset()
+
+        # An expired entry is served as-is while another caller holds the lock
+        stale = {'verb': 'haz', 'noun': 'stale cheezburger'}
+        cache.set('stale_cheezburger', (stale, time.time() - 1, 0.1), 60)
+        cache.add('stale_cheezburger:lock', True, 30)
+        response = self.client.get('/stale/')
+        self.assertEqual(response.content, 'I can haz stale cheezburger\n')
+        self.assertEqual(cache_stats.get(view_name)['coalesced'], 1)
+
+        # Once the lock is released, the next caller regenerates the context
+        cache.delete('stale_cheezburger:lock')
+        response = self.client.get('/stale/')
+        self.assertEqual(response.content, 'I can haz fresh cheezburger\n')
+        self.assertEqual(cache_stats.get(view_name)['regenerations'], 1)
+        self.assertEqual(cache.get('stale_cheezburger:lock'), None)
+        cache.delete('stale_cheezburger')
+
+        # Entries stored without cache_stale_time are misses, and so are
+        # stale entries read without it
+        for entry in [{'noun': 'plain cheezburger'},
+                      {'verb': 'haz', 'noun': 'plain cheezburger',
+                       'lol': 'cat'}]:
+            cache.set('stale_cheezburger', entry, 60)
+            response = self.client.get('/stale/')
+            self.assertEqual(response.content,
+                             'I can haz fresh cheezburger\n')
+            cache.delete('stale_cheezburger')
+        cache.set('timed_cheezburger',
+                  ({'verb': 'haz', 'noun': 'stale cheezburger'},
+                   time.time() + 60, 0.1), 60)
+        response = self.client.get('/timed/')
+        self.assertEqual(response.content, 'I can haz timed cheezburger\n')
+        cache.delete('timed_cheezburger')
+
+    def test_local_context(self):
+        from baseviews.caching import cache_stats
+        view_name = 'test_project.views.LocalCheezburger'
+        cache_stats.reset()
+
+        response = self.client.get('/local/')
+        self.assertEqual(response.content, 'I can haz local cheezburger\n')
+
+        # The second request is served from memory, not the Django cache
+        cache.delete('local_cheezburger')
+        response = self.client.get('/local/')
+        self.assertEqual(response.content, 'I can haz local cheezburger\n')
+        self.assertEqual(cache_stats.get(view_name)['local_hits'], 1)
+        self.assertEqual(cache.get('local_cheezburger'), None)
+
+    def test_cached_response(self):
+        from test_project.views import CachedCheezburger
+        CachedCheezburger.times_rendered = 0
+
+        response = self.client.get('/cached/')
+        self.assertEqual(response.content, 'I can haz cached cheezburger\n')
+        # The response is shared, so per-user context processors aren't run
+        self.assertEqual(response.context.get('user'), None)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get('/cached/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, '')
+
+        response = self.client.get('/cached/',
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/cached/', HTTP_IF_NONE_MATCH='"nope"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, 'I can haz cached cheezburger\n')
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(CachedCheezburger.times_rendered, 1)
+        cache.delete('cached_cheezburger')
+        cache.delete('cached_cheezburger:response')
+
+        # Responses that aren't cached still get the context processors
+        from django.template import RequestContext
+        response = self.client.post('/cached/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(isinstance(response.context, RequestContext))
+        cache.delete('cached_cheezburger')
+
+        from django.http import HttpRequest
+        from baseviews.views import FormView
+
+        class CachedFormView(FormView):
+            cache_key = 'cached_form'
+            cache_response = True
+        request = HttpRequest()
+        request.method = 'GET'
+        view = CachedFormView.new_instance()
+        view.__init__(request)
+        self.assertTrue(isinstance(view.get_template_context(),
+                                   RequestContext))
+
+    def test_context_sections(self):
+        from test_project.views import SectionedCheezburger
+        SectionedCheezburger.sections_generated = []
+
+        response = self.client.get('/sectioned/')
+        self.assertEqual(response.content,
+                         'I can haz sectioned cheezburger\n')
+        self.assertEqual(sorted(SectionedCheezburger.sections_generated),
+                         ['noun', 'verb'])
+        self.assertEqual(cache.get('sectioned_cheezburger:verb'),
+                         {'verb': 'haz'})
+
+        # Only the section that is missing from the cache is regenerated
+        cache.delete('sectioned_cheezburger:verb')
+        response = self.client.get('/sectioned/')
+        self.assertEqual(response.content,
+                         'I can haz sectioned cheezburger\n')
+        self.assertEqual(sorted(SectionedCheezburger.sections_generated),
+                         ['noun', 'verb', 'verb'])
+        cache.delete('sectioned_cheezburger:verb')
+        cache.delete('sectioned_cheezburger:noun')
+
+        # Without a cache key, the section keys still vary on vary_on
+        from django.http import HttpRequest
+
+        class SluggedCheezburger(BasicView):
+            vary_on = ('kwarg:slug',)
+            context_sections = {'noun': 60}
+
+            def noun_section(self):
+                return {'noun': self.kwargs['slug']}
+        request = HttpRequest()
+        request.method = 'GET'
+        keys = []
+        for slug in ('a', 'b'):
+            view = SluggedCheezburger.new_instance()
+            view.__init__(request, slug=slug)
+            self.assertEqual(view.get_section_context(), {'noun': slug})
+            keys.append(view.get_section_cache_key('noun'))
+        self.assertNotEqual(keys[0], keys[1])
+        for key in keys:
+            cache.delete(key)
+
+    def test_encoded_context(self):
+        from baseviews.caching import cache_stats
+        view_name = 'test_project.views.EncodedCheezburger'
+        cache_stats.reset()
+
+        response = self.client.get('/encoded/')
+        self.assertEqual(response.content, 'I can haz encoded cheezburger\n')
+        # The encoded context is larger than cache_max_size, so it's chunked
+        entry = cache.get('encoded_cheezburger')
+        self.assertEqual(entry[0], 'chunks')
+        self.assertTrue(entry[2] > 1)
+
+        response = self.client.get('/encoded/')
+        self.assertEqual(response.content, 'I can haz encoded cheezburger\n')
+        stats = cache_stats.get(view_name)
+        self.assertEqual(stats['encodes'], 1)
+        self.assertEqual(stats['decodes'], 1)
+        self.assertEqual(stats['chunked'], 1)
+        self.assertEqual(stats['encoded_bytes'], stats['max_encoded_bytes'])
+        cache.delete('encoded_cheezburger')
+
+        # Entries the codec can't decode, such as ones cached before it was
+        # set, are misses rather than errors
+        for entry in [{'verb': 'haz', 'noun': 'plain cheezburger'},
+                      ({'verb': 'haz'}, time.time() + 60, 0.1),
+                      'x not encoded', 'r not pickled']:
+            cache.set('encoded_cheezburger', entry)
+            response = self.client.get('/encoded/')
+            self.assertEqual(response.content,
+                             'I can haz encoded cheezburger\n')
+        cache.delete('encoded_cheezburger')
+
+    def test_plain_context_size(self):
+        from django.http import HttpRequest
+        from baseviews.caching import cache_stats, view_name
+
+        class LargeCheezburger(BasicView):
+            template = 'home.html'
+            cache_key = 'large_cheezburger'
+            cache_max_size = 100
+
+            def cached_context(self):
+                return {'verb': 'haz', 'noun': 'cheezburger ' * 20}
+        request = HttpRequest()
+        request.method = 'GET'
+        cache_stats.reset()
+
+        # Without a codec, contexts are given to the cache as they are,
+        # without being pickled here to measure them
+        LargeCheezburger(request)
+        self.assertEqual(cache.get('large_cheezburger'),
+                         {'verb': 'haz', 'noun': 'cheezburger ' * 20})
+        stats = cache_stats.get(view_name(LargeCheezburger))
+        self.assertFalse('encoded_bytes' in stats)
+
+        # With cache_chunks, they are pickled, and the pickle is chunked.
+        # The plain entry is a miss, since it isn't encoded.
+        LargeCheezburger.cache_chunks = True
+        LargeCheezburger(request)
+        self.assertEqual(cache.get('large_cheezburger')[0], 'chunks')
+        response = LargeCheezburger(request)
+        self.assertEqual(response.content,
+                         'I can haz %s\n' % ('cheezburger ' * 20))
+        stats = cache_stats.get(view_name(LargeCheezburger))
+        self.assertEqual((stats['misses'], stats['hits'], stats['chunked']),
+                         (2, 1, 1))
+        cache.delete('large_cheezburger')
+
+    def test_negative_cache(self):
+        from baseviews.caching import cache_stats
+        from baseviews.context import EMPTY
+        from test_project.views import MissingCheezburger
+        view_name = 'test_project.views.MissingCheezburger'
+        cache_stats.reset()
+        cache.clear()
+        MissingCheezburger.times_generated = 0
+
+        for i in range(2):
+            response = self.client.get('/missing/bucket/')
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get('/missing/nothing/')
+            self.assertEqual(response.status_code, 404)
+        # Each missing noun only ran cached_context once
+        self.assertEqual(MissingCheezburger.times_generated, 2)
+        self.assertEqual(cache_stats.get(view_name)['negative_hits'], 2)
+
+        response = self.client.get('/missing/cheezburger/')
+        self.assertEqual(response.content, 'I can haz cheezburger\n')
+
+        # The in-process cache keeps EMPTY for the negative_cache_time too
+        from django.http import HttpRequest, Http404
+        from baseviews.caching import get_local_cache
+
+        class LocalMissingCheezburger(MissingCheezburger):
+            cache_key = 'local_missing_cheezburger'
+            local_cache_size = 10
+        request = HttpRequest()
+        request.method = 'GET'
+        self.assertRaises(Http404, LocalMissingCheezburger, request,
+                          noun='bucket')
+        local_cache = get_local_cache(LocalMissingCheezburger)
+        [(value, expires)] = local_cache.entries.values()
+        self.assertEqual(value, EMPTY)
+        self.assertTrue(expires <= time.time() +
+                        LocalMissingCheezburger.negative_cache_time)
+
+        # Without negative caching, EMPTY isn't kept at all
+        class LocalNothingCheezburger(LocalMissingCheezburger):
+            cache_key = 'local_nothing_cheezburger'
+            negative_cache_time = None
+        self.assertRaises(Http404, LocalNothingCheezburger, request,
+                          noun='nothing')
+        self.assertEqual(get_local_cache(LocalNothingCheezburger).entries, {})
+
+    def test_streaming_view(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from django.http import HttpRequest
+        from baseviews.signals import view_timed
+        from test_project.views import StreamingCheezburgers
+        expected = ['I can haz cheezburgers:\n',
+                    'cheezburger 0\ncheezburger 1\n',
+                    'cheezburger 2\ncheezburger 3\n',
+                    'cheezburger 4\n',
+                    'Om nom nom\n']
+
+        response = self.client.get('/streaming/')
+        self.assertEqual(response.content, ''.join(expected))
+
+        # Items are only rendered as the response is read
+        StreamingCheezburgers.burgers_made = 0
+        request = HttpRequest()
+        request.method = 'GET'
+        response = StreamingCheezburgers(request)
+        self.assertEqual(StreamingCheezburgers.burgers_made, 0)
+        self.assertEqual(list(response), expected)
+        self.assertEqual(StreamingCheezburgers.burgers_made, 5)
+
+        # The header is rendered in the render phase, and the response isn't
+        # consumed by the response cache
+        class TimedStreamingCheezburgers(StreamingCheezburgers):
+            cache_key = 'timed_streaming_cheezburgers'
+            cache_response = True
+            instrument = True
+        phases = []
+
+        def receiver(sender, view, timings, response, **kwargs):
+            phases.append([phase.name for phase in timings.phases])
+        view_timed.connect(receiver, sender=TimedStreamingCheezburgers)
+        try:
+            for i in range(2):
+                response = TimedStreamingCheezburgers(request)
+                self.assertEqual(list(response), expected)
+        finally:
+            view_timed.disconnect(receiver, sender=TimedStreamingCheezburgers)
+        self.assertTrue('render' in phases[0])
+
+        # Items can't be cached, since they would be read all at once
+        class CachedStreamingCheezburgers(StreamingCheezburgers):
+            cache_key = 'cached_streaming_cheezburgers'
+
+            def cached_context(self):
+                return {'items': self.make_burgers()}
+
+            def uncached_context(self):
+                return {}
+        self.assertRaises(ImproperlyConfigured,
+                          CachedStreamingCheezburgers, request)
+
+    def test_profiled_view(self):
+        from baseviews.profiling import profile_signature
+        from baseviews.signals import view_profiled
+        profiles = []
+
+        def receiver(sender, view, profiler, response, **kwargs):
+            profiles.append((sender.__name__, view.timings, profiler))
+        view_profiled.connect(receiver)
+        try:
+            response = self.client.get('/profiled/')
+            self.assertEqual(response.content,
+                             'I can haz profiled cheezburger\n')
+            response = self.client.get('/profiled/',
+                                       HTTP_X_BASEVIEWS_PROFILE='nope')
+            self.assertEqual(profiles, [])
+
+            signature = profile_signature('/profiled/')
+            response = self.client.get('/profiled/',
+                                       HTTP_X_BASEVIEWS_PROFILE=signature)
+            self.assertEqual(response.content,
+                             'I can haz profiled cheezburger\n')
+            self.assertEqual(len(profiles), 1)
+            name, timings, profiler = profiles[0]
+            self.assertEqual(name, 'ProfiledCheezburger')
+            self.assertEqual([phase.name for phase in timings.phases],
+                             ['init', 'render'])
+            self.assertTrue(profiler.getstats())
+        finally:
+            view_profiled.disconnect(receiver)
+
+    def test_cached_template(self):
+        from test_project.views import CompiledCheezburger
+
+        response = self.client.get('/compiled/')
+        self.assertEqual(response.content,
+                         'I can haz compiled cheezburger\n')
+        self.assertEqual(response.template.name, 'home.html')
+        template = CompiledCheezburger._template_cache.get(
+            ('lol/missing.html', 'home.html'))[0]
+
+        response = self.client.get('/compiled/')
+        self.assertEqual(response.content,
+                         'I can haz compiled cheezburger\n')
+        self.assertTrue(CompiledCheezburger._template_cache.get(
+            ('lol/missing.html', 'home.html'))[0] is template)
+
+    def test_cached_template_reload(self):
+        import os
+        import shutil
+        import tempfile
+        from django.http import HttpRequest
+        directory = tempfile.mkdtemp()
+
+        def write(name, content, age):
+            path = os.path.join(directory, name)
+            open(path, 'w').write(content)
+            os.utime(path, (time.time() - age, time.time() - age))
+        write('base.html', '{% block body %}{% endblock %}!', 60)
+        write('cheezburger.html', 'cheezburger', 60)
+        write('lol.html', '{% extends "base.html" %}{% block body %}'
+                          'I can haz {% include "cheezburger.html" %}'
+                          '{% endblock %}', 60)
+
+        class ReloadedCheezburger(BasicView):
+            cache_template = True
+            template_cache_size = 2
+
+            def get_template(self):
+                return self.kwargs.get('template', 'lol.html')
+
+            def get_context(self):
+                return {}
+        request = HttpRequest()
+        request.method = 'GET'
+        old_settings = (settings.DEBUG, settings.TEMPLATE_DEBUG,
+                        settings.TEMPLATE_DIRS)
+        settings.DEBUG = settings.TEMPLATE_DEBUG = True
+        settings.TEMPLATE_DIRS = (directory,)
+        try:
+            response = ReloadedCheezburger(request)
+            self.assertEqual(response.content, 'I can haz cheezburger!')
+
+            # Changes to the included and extended templates are picked up
+            write('cheezburger.html', 'bucket', 30)
+            response = ReloadedCheezburger(request)
+            self.assertEqual(response.content, 'I can haz bucket!')
+            write('base.html', '{% block body %}{% endblock %}?', 0)
+            response = ReloadedCheezburger(request)
+            self.assertEqual(response.content, 'I can haz bucket?')
+
+            # Only template_cache_size templates are kept
+            ReloadedCheezburger(request, template='base.html')
+            ReloadedCheezburger(request, template='cheezburger.html')
+            self.assertEqual(
+                len(ReloadedCheezburger._template_cache.entries), 2)
+        finally:
+            (settings.DEBUG, settings.TEMPLATE_DEBUG,
+             settings.TEMPLATE_DIRS) = old_settings
+            shutil.rmtree(directory)
+
+    def test_instrumented_view(self):
+        from baseviews.signals import view_timed
+        from test_project.views import TimedCheezburger
+        reports = []
+
+        def receiver(sender, view, timings, response, **kwargs):
+            reports.append(dict((phase.name, phase.info)
+                                for phase in timings.phases))
+        view_timed.connect(receiver, sender=TimedCheezburger)
+
+        try:
+            response = self.client.get('/timed/')
+            self.assertEqual(response.content,
+                             'I can haz timed cheezburger\n')
+            self.assertTrue('cache_get;desc="miss";dur=' in
+                            response['Server-Timing'])
+            self.assertTrue('render;dur=' in response['Server-Timing'])
+
+            response = self.client.get('/timed/')
+            self.assertTrue('cache_get;desc="hit";dur=' in
+                            response['Server-Timing'])
+        finally:
+            view_timed.disconnect(receiver, sender=TimedCheezburger)
+            cache.delete('timed_cheezburger')
+
+        self.assertEqual(len(reports), 2)
+        self.assertTrue('cached_context' in reports[0])
+        self.assertFalse('cached_context' in reports[1])
+        self.assertEqual(reports[1]['render']['bytes'],
+                         len('I can haz timed cheezburger\n'))
+
+    def test_tagged_context(self):
+        from django.db.models.signals import post_save
+        from baseviews.caching import invalidate_tags
+        from test_project.views import TaggedCheezburger
+        TaggedCheezburger.times_generated = 0
+
+        class Options(object):
+            app_label = 'lol'
+            object_name = 'Cheezburger'
+
+        class Cheezburger(object):
+            _meta = Options()
+
+        self.client.get('/tagged/')
+        self.client.get('/tagged/')
+        self.assertEqual(TaggedCheezburger.times_generated, 1)
+
+        invalidate_tags('burgers')
+        self.client.get('/tagged/')
+        self.assertEqual(TaggedCheezburger.times_generated, 2)
+
+        # Saving an instance of one of the cache_models invalidates it too
+        post_save.send(sender=Cheezburger, instance=None, created=True)
+        response = self.client.get('/tagged/')
+        self.assertEqual(response.content, 'I can haz tagged cheezburger\n')
+        self.assertEqual(TaggedCheezburger.times_generated, 3)
+
+    def test_vary_on(self):
+        from test_project.views import VariedCheezburger
+        VariedCheezburger.times_generated = 0
+        response = self.client.get('/varied/', {'noun': 'cheezburger'})
+        self.assertEqual(response.content, 'I can haz cheezburger\n')
+        response = self.client.get('/varied/', {'noun': 'bucket'})
+        self.assertEqual(response.content, 'I can haz bucket\n')
+        self.assertEqual(VariedCheezburger.times_generated, 2)
+
+        # A different language is cached under a different key
+        response = self.client.get('/varied/', {'noun': 'cheezburger'},
+                                   HTTP_ACCEPT_LANGUAGE='fr')
+        self.assertEqual(response.content, 'I can haz cheezburger\n')
+        self.assertEqual(VariedCheezburger.times_generated, 3)
+        self.client.get('/varied/', {'noun': 'cheezburger'},
+                        HTTP_ACCEPT_LANGUAGE='fr')
+        self.client.get('/varied/', {'noun': 'cheezburger'})
+        self.assertEqual(VariedCheezburger.times_generated, 3)
+
+    def test_warm_view_cache(self):
+        from StringIO import StringIO
+        from django.core.management import call_command
+        from test_project.views import SectionedCheezburger
+        SectionedCheezburger.sections_generated = []
+        output = StringIO()
+
+        call_command('warm_view_cache',
+                     'test_project.views.SectionedCheezburger',
+                     workers=2, stdout=output)
+        self.assertEqual(sorted(SectionedCheezburger.sections_generated),
+                         ['noun', 'verb'])
+        self.assertEqual(cache.get('sectioned_cheezburger:verb'),
+                         {'verb': 'haz'})
+        self.assertTrue('SectionedCheezburger: 1 warmed, 0 failed' in
+                        output.getvalue())
+
+        # The warmed sections are used by the next request
+        self.client.get('/sectioned/')
+        self.assertEqual(len(SectionedCheezburger.sections_generated), 2)
+        cache.delete('sectioned_cheezburger:verb')
+        cache.delete('sectioned_cheezburger:noun')
+
+        # Worker processes wouldn't share the locmem cache
+        from django.core.management.base import CommandError
+        from baseviews.management.commands.warm_view_cache import Command
+        self.assertRaises(CommandError, Command().handle,
+                          'test_project.views.SectionedCheezburger',
+                          processes=True)
+
+    def test_lazy_values(self):
+        from test_project.views import LazyCheezburgers
+        LazyCheezburgers.times_counted = 0
+
+        response = self.client.get('/lazy/')
+        self.assertEqual(response.content, '\n')
+        self.assertEqual(LazyCheezburgers.times_counted, 0)
+
+        response = self.client.get('/lazy/', {'show': 1})
+        self.assertEqual(response.content, '3 3\n')
+        self.assertEqual(LazyCheezburgers.times_counted, 1)
+
+        # Lazy values are evaluated before the context is cached
+        response = self.client.get('/ajax/lazy/',
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(simplejson.loads(response.content), {'burgers': 3})
+        self.assertEqual(cache.get('lazy_dirt'), {'burgers': 3})
+        self.assertEqual(LazyCheezburgers.times_counted, 2)
+        cache.delete('lazy_dirt')
+
+    def test_field_selection(self):
+        from test_project.views import LazyCheezburgers
+        LazyCheezburgers.times_counted = 0
+
+        response = self.client.get('/ajax/selective/', {'fields': 'armed'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(simplejson.loads(response.content),
+                         {'armed': '...with Ajax!'})
+        self.assertEqual(LazyCheezburgers.times_counted, 0)
+
+        # Each selection of fields is cached separately
+        response = self.client.get('/ajax/selective/',
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(simplejson.loads(response.content),
+                         {'armed': '...with Ajax!', 'burgers': 3})
+        self.assertEqual(LazyCheezburgers.times_counted, 1)
+
+        response = self.client.get('/ajax/selective/',
+                                   {'fields': 'armed,bucket'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/ajax/selective/',
+                                   {'fields': u'armed,caf\xe9'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, 'Unknown fields: caf\xc3\xa9')
+        cache.delete('selective_dirt')
+        cache.delete(vary_cache_key('selective_dirt', ['armed']))
+
     def test_ajax_view(self):
         response = self.client.get('/ajax/')
 
@@ -38,6 +610,155 @@ class BaseviewTests(TestCase):
         self.assertEqual(simplejson.loads(response.content)['armed'],
                          '...with Ajax!')
 
+    def test_streaming_ajax_view(self):
+        response = self.client.get('/ajax/stream/',
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        data = simplejson.loads(response.content)
+        self.assertEqual(data['armed'], '...with Ajax!')
+        self.assertEqual(data['rounds'], [i * i for i in range(100)])
+
+        # Streamed responses aren't consumed by the response cache
+        rounds = data['rounds']
+        for i in range(2):
+            response = self.client.get('/ajax/stream/cached/',
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(simplejson.loads(response.content)['rounds'],
+                             rounds)
+
+    def test_compressed_ajax_view(self):
+        import gzip
+        from StringIO import StringIO
+        expected = {'armed': ['...with Ajax!'] * 20}
+
+        for i in range(2):
+            # The first response is compressed as it is rendered, and the
+            # second is compressed content from the response cache.
+            response = self.client.get('/ajax/gzip/',
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                                       HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertTrue('Accept-Encoding' in response['Vary'])
+            self.assertTrue(response['ETag'].endswith('-gzip"'))
+            content = gzip.GzipFile(fileobj=StringIO(response.content)).read()
+            self.assertEqual(simplejson.loads(content), expected)
+        gzip_etag = response['ETag']
+
+        response = self.client.get('/ajax/gzip/',
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertTrue('Accept-Encoding' in response['Vary'])
+        self.assertEqual(simplejson.loads(response.content), expected)
+
+        # The two encodings have different ETags
+        self.assertNotEqual(response['ETag'], gzip_etag)
+        response = self.client.get('/ajax/gzip/',
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                                   HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/ajax/gzip/',
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                                   HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue('Accept-Encoding' in response['Vary'])
+        cache.delete('compressed_dirt')
+        cache.delete('compressed_dirt:response')
+
+    def test_batch_ajax_view(self):
+        batch = simplejson.dumps([
+            '/ajax/',
+            ['/ajax/selective/', {'fields': 'armed'}],
+            {'url': '/ajax/selective/?fields=nope'},
+            '/lol/',
+            '/nowhere/',
+        ])
+        response = self.client.get('/ajax/batch/', {'requests': batch})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/ajax/batch/', {'requests': batch},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        responses = simplejson.loads(response.content)['responses']
+        self.assertEqual([item['status'] for item in responses],
+                         [200, 200, 400, 404, 404])
+        self.assertEqual(responses[0]['body'], {'armed': '...with Ajax!'})
+        self.assertEqual(responses[1]['body'], {'armed': '...with Ajax!'})
+
+        response = self.client.post('/ajax/batch/', {'requests': '{}'},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        cache.delete(vary_cache_key('selective_dirt', ['armed']))
+
+    def test_batch_ajax_view_errors(self):
+        from django.core.signals import got_request_exception
+        from test_project.factory import RequestFactory
+        from test_project.views import DirtBatch
+        errors = []
+
+        # Errors in the views are reported like errors in whole requests.
+        # The view is called directly, since the test client re-raises them.
+        def receiver(sender, request, **kwargs):
+            errors.append(request.path)
+        request = RequestFactory().post(
+            '/ajax/batch/',
+            {'requests': simplejson.dumps(['/ajax/', '/ajax/broken/'])},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        got_request_exception.connect(receiver, sender=DirtBatch)
+        debug, settings.DEBUG = settings.DEBUG, False
+        try:
+            response = DirtBatch(request)
+        finally:
+            settings.DEBUG = debug
+            got_request_exception.disconnect(receiver, sender=DirtBatch)
+        responses = simplejson.loads(response.content)['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 500])
+        self.assertEqual(errors, ['/ajax/broken/'])
+
+    def test_view_cache_report(self):
+        from StringIO import StringIO
+        from django.core.management import call_command
+        from baseviews.caching import (STATS_INDEX, STATS_PREFIX,
+                                       cache_stats, clear_published_stats,
+                                       collect_stats, publish_stats)
+        view_name = 'test_project.views.EncodedCheezburger'
+        cache_stats.reset()
+        cache.clear()
+
+        self.client.get('/encoded/')
+        self.client.get('/encoded/')
+        publish_stats()
+        # Pretend that another process has published its statistics too
+        cache.set(STATS_PREFIX + 'elsewhere',
+                  {view_name: {'hits': 3, 'max_encoded_bytes': 1}})
+        cache.set(STATS_INDEX, cache.get(STATS_INDEX) + [STATS_PREFIX +
+                                                         'elsewhere'])
+
+        stats = collect_stats()[view_name]
+        self.assertEqual(stats['hits'], 4)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['sets'], 1)
+        self.assertEqual(stats['generations'], 1)
+        self.assertEqual(stats['max_encoded_bytes'],
+                         cache_stats.get(view_name)['max_encoded_bytes'])
+
+        output = StringIO()
+        call_command('view_cache_report', clear=True, stdout=output)
+        self.assertTrue(view_name in output.getvalue())
+        self.assertEqual(collect_stats(), {})
+        cache.delete('encoded_cheezburger')
+
+        # Sizes are averaged over the encoded contexts, and views without a
+        # codec have none
+        from baseviews.management.commands.view_cache_report import summarize
+        row = summarize(view_name, stats)
+        self.assertEqual(row['average_bytes'],
+                         float(stats['encoded_bytes']) / stats['encodes'])
+        self.assertTrue(row['average_bytes'] > 0)
+        row = summarize('test_project.views.TimedCheezburger',
+                        {'misses': 1, 'sets': 1})
+        self.assertEqual(row['average_bytes'], None)
+
     def test_form_view(self):
         from test_project.views import KittehForm
 
@@ -50,6 +771,74 @@ class BaseviewTests(TestCase):
         self.assertEqual(response._headers['location'][1],
                          'http://testserver/pewpewpew/')
 
+    def test_cached_form_html(self):
+        from test_project.views import CountedKittehForm, KittehForm
+        cache.clear()
+        CountedKittehForm.instances = 0
+
+        response = self.client.get('/kitteh/cached/')
+        self.assertEqual(response.content, str(KittehForm()))
+        self.assertEqual(CountedKittehForm.instances, 1)
+
+        # The second request renders the cached HTML without a form
+        response = self.client.get('/kitteh/cached/')
+        self.assertEqual(response.content, str(KittehForm()))
+        self.assertEqual(CountedKittehForm.instances, 1)
+
+        # Bound forms are never cached, so their errors are shown
+        response = self.client.post('/kitteh/cached/', {'caption': ''})
+        self.assertEqual(response.content, str(KittehForm({'caption': ''})))
+        self.assertEqual(CountedKittehForm.instances, 2)
+
+    def test_form_cache_key(self):
+        from django.http import HttpRequest
+        from test_project.lol.models import Cheezburger
+        from test_project.views import CachedKittehView, KittehForm
+        request = HttpRequest()
+        request.method = 'GET'
+        view = CachedKittehView.new_instance()
+        view.__init__(request)
+        first = Cheezburger.objects.create(name='first')
+        second = Cheezburger.objects.create(name='second')
+
+        # Model instances with the same repr get different keys
+        self.assertEqual(repr(first), repr(second))
+        keys = [view.get_form_cache_key(KittehForm,
+                                        {'initial': {'burger': burger}})
+                for burger in (first, second)]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], view.get_form_cache_key(
+            KittehForm, {'initial': {'burger': first}}))
+
+        # Other objects aren't cached
+        self.assertEqual(view.get_form_cache_key(
+            KittehForm, {'initial': {'burger': object()}}), None)
+        self.assertEqual(view.get_form_cache_key(
+            KittehForm, {'initial': {'burger': Cheezburger()}}), None)
+
+    def test_deferred_forms(self):
+        from django.http import HttpRequest, QueryDict
+        from test_project.views import (CachedKittehView, CountedKittehForm,
+                                        MonorailCatTicketsView)
+        CountedKittehForm.instances = 0
+        request = HttpRequest()
+        request.method = 'POST'
+        request.POST = QueryDict('caption=Not+yours.&bark=Woof!')
+
+        # The form isn't built until it is used
+        view = CachedKittehView.new_instance()
+        view.__init__(request)
+        self.assertEqual(CountedKittehForm.instances, 0)
+        self.assertTrue(view.form.is_valid())
+        self.assertTrue(view.form is view.form)
+        self.assertEqual(CountedKittehForm.instances, 1)
+
+        view = MonorailCatTicketsView.new_instance()
+        view.__init__(request)
+        self.assertEqual(view.form, None)
+        self.assertEqual(sorted(view.forms), ['goggie_form', 'kitteh_form'])
+        self.assertTrue(view.forms['goggie_form'].is_valid())
+
     def test_multi_form_view(self):
         from test_project.views import KittehForm, GoggieForm
 
@@ -63,3 +852,308 @@ class BaseviewTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response._headers['location'][1],
                          'http://testserver/derailed/')
+
+    def test_transactional_save(self):
+        from baseviews.signals import forms_saved
+        saved = []
+
+        def receiver(sender, view, queries, **kwargs):
+            saved.append((view.__class__.__name__, queries))
+        forms_saved.connect(receiver)
+        try:
+            response = self.client.post('/monorail/transactional/',
+                                        {'caption': 'Not yours.'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(saved, [])
+
+            response = self.client.post('/monorail/transactional/',
+                                        {'caption': 'Not yours.',
+                                         'bark': 'Woof!'})
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(response._headers['location'][1],
+                             'http://testserver/derailed/')
+            # The test forms don't touch the database
+            self.assertEqual(saved, [('TransactionalMonorailView', 0)])
+        finally:
+            forms_saved.disconnect(receiver)
+
+
+class SaveFormsTests(TransactionTestCase):
+
+    def post(self, view_class, data):
+        from test_project.factory import RequestFactory
+        request = RequestFactory().post('/nom/', data)
+        return view_class(request)
+
+    def test_bulk_save(self):
+        from baseviews.signals import forms_saved
+        from test_project.lol.models import Cheezburger
+        from test_project.views import BulkCheezburgerView
+        Cheezburger.times_saved = 0
+        saved = []
+
+        def receiver(sender, view, queries, **kwargs):
+            saved.append(queries)
+        forms_saved.connect(receiver, sender=BulkCheezburgerView)
+        try:
+            response = self.post(BulkCheezburgerView, {
+                'name': 'cheezburger',
+                'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '0',
+                'form-0-name': 'bucket', 'form-1-name': 'pony'})
+        finally:
+            forms_saved.disconnect(receiver, sender=BulkCheezburgerView)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(Cheezburger.objects.values_list('name',
+                                                                flat=True)),
+                         ['bucket', 'cheezburger', 'pony'])
+        # Some versions of Django also look up the formset's existing
+        # instances while saving it.
+        if hasattr(Cheezburger.objects, 'bulk_create'):
+            # One query creates them all, without calling their save methods
+            self.assertTrue(saved[0] in (1, 2))
+            self.assertEqual(Cheezburger.times_saved, 0)
+        else:
+            self.assertTrue(saved[0] in (3, 4))
+            self.assertEqual(Cheezburger.times_saved, 3)
+
+    def test_bulk_save_inline(self):
+        from test_project.lol.models import Bucket, Cheezburger
+        from test_project.views import BulkBucketView
+        response = self.post(BulkBucketView, {
+            'name': 'cheezburger',
+            'bucket_set-TOTAL_FORMS': '2', 'bucket_set-INITIAL_FORMS': '0',
+            'bucket_set-0-name': 'red', 'bucket_set-1-name': 'blue'})
+        # The burger was saved before the buckets that point to it, even
+        # though its form comes second
+        burger = Cheezburger.objects.get()
+        self.assertEqual(response['Location'], '/nom/%d/' % burger.pk)
+        self.assertEqual(sorted(Bucket.objects.filter(burger=burger)
+                                .values_list('name', flat=True)),
+                         ['blue', 'red'])
+
+    def test_transactional_save(self):
+        from test_project.lol.models import Cheezburger
+        from test_project.views import BrokenCheezburgerView
+        self.assertRaises(ValueError, self.post, BrokenCheezburgerView,
+                          {'name': 'cheezburger'})
+        # The model form was saved first, and rolled back
+        self.assertEqual(Cheezburger.objects.count(), 0)
+
+
+class SerializerTests(unittest.TestCase):
+
+    def test_iter_json(self):
+        import datetime
+        from baseviews.serializers import iter_json
+        data = {'burgers': iter([1, 2, 3]),
+                'nested': {'bucket': None, 'lost': (True, False)},
+                'when': datetime.date(2010, 6, 1)}
+        chunks = list(iter_json(data, chunk_size=8))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(simplejson.loads(''.join(chunks)),
+                         {'burgers': [1, 2, 3],
+                          'nested': {'bucket': None, 'lost': [True, False]},
+                          'when': '2010-06-01'})
+
+    def test_lazy_serialization(self):
+        from baseviews.context import LazyValue
+        from baseviews.serializers import JSONSerializer, iter_json
+        data = {'burgers': LazyValue(lambda: [1, 2, 3])}
+        self.assertEqual(simplejson.loads(JSONSerializer().dumps(data)),
+                         {'burgers': [1, 2, 3]})
+        data = {'burgers': LazyValue(lambda: iter([1, 2, 3]))}
+        self.assertEqual(simplejson.loads(''.join(iter_json(data))),
+                         {'burgers': [1, 2, 3]})
+
+    def test_serializers(self):
+        import datetime
+        import decimal
+        from baseviews.context import LazyValue
+        from baseviews.serializers import (FastJSONSerializer,
+                                           JSONSerializer, get_serializer)
+        self.assertTrue(isinstance(get_serializer(), JSONSerializer))
+        serializer = get_serializer(
+            'baseviews.serializers.FastJSONSerializer')
+        self.assertTrue(isinstance(serializer, FastJSONSerializer))
+        self.assertTrue(serializer is get_serializer(
+            'baseviews.serializers.FastJSONSerializer'))
+
+        data = {'burgers': 3, 'when': datetime.date(2010, 6, 1)}
+        self.assertEqual(simplejson.loads(serializer.dumps(data)),
+                         {'burgers': 3, 'when': '2010-06-01'})
+
+        # Whichever ujson is installed, if any, the output matches
+        data = {'cost': decimal.Decimal('1.10'), 'ratio': 0.1 + 0.2,
+                'big': 10 ** 20, 'lazy': [LazyValue(lambda: u'caf\xe9')]}
+        self.assertEqual(simplejson.loads(serializer.dumps(data)),
+                         simplejson.loads(JSONSerializer().dumps(data)))
+
+    def test_prepare_for_ujson(self):
+        import datetime
+        import decimal
+        from baseviews.context import LazyValue
+        from baseviews.serializers import JSONEncoder, prepare_for_ujson
+        data = {'when': (datetime.date(2010, 6, 1),),
+                'cost': decimal.Decimal('1.10'),
+                'lazy': LazyValue(lambda: {'burgers': 3})}
+        self.assertEqual(prepare_for_ujson(data, JSONEncoder()),
+                         {'when': ['2010-06-01'], 'cost': '1.10',
+                          'lazy': {'burgers': 3}})
+
+
+class CachingTests(unittest.TestCase):
+
+    def test_vary_cache_key(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from baseviews.caching import compile_vary_on, vary_cache_key
+        key = vary_cache_key('lol_detail', ['1', 'anonymous'])
+        self.assertTrue(key.startswith('lol_detail:'))
+        self.assertEqual(key, vary_cache_key('lol_detail', ['1', 'anonymous']))
+        self.assertNotEqual(key, vary_cache_key('lol_detail', ['2', 'nope']))
+
+        long_key = vary_cache_key('lol ' * 100, ['1'])
+        self.assertTrue(len(long_key) < 100)
+        self.assertFalse(' ' in long_key)
+
+        self.assertEqual(len(compile_vary_on(('kwarg:slug', 'get', 'user'))),
+                         3)
+        self.assertRaises(ImproperlyConfigured, compile_vary_on, ('cookie',))
+
+    def test_vary_on_non_ascii(self):
+        from test_project.factory import RequestFactory
+        from baseviews.caching import compile_vary_on, vary_cache_key
+        request = RequestFactory().get(u'/lol/caf\xe9/',
+                                       {u'q': u'caf\xe9', u'n\xf6un': u'1'})
+        view = BasicView.new_instance()
+        view.__init__(request, u'caf\xe9', noun=u'caf\xe9')
+        values = [function(view) for function in
+                  compile_vary_on(('path', 'get', 'args', 'kwargs',
+                                   'get:q', 'language'))]
+        key = vary_cache_key(u'lol_caf\xe9', values)
+        self.assertTrue(isinstance(key, str))
+        self.assertEqual(key, vary_cache_key(u'lol_caf\xe9', values))
+        self.assertEqual(vary_cache_key('lol', [u'caf\xe9', 'q=caf\xc3\xa9']),
+                         vary_cache_key('lol', ['caf\xc3\xa9', u'q=caf\xe9']))
+        self.assertNotEqual(key, vary_cache_key(u'lol_caf\xe9', ['/lol/']))
+
+    def test_null_phase(self):
+        from baseviews.instrumentation import null_phase
+        # The shared phase of uninstrumented views keeps nothing
+        with null_phase as phase:
+            phase.info['hit'] = True
+        self.assertEqual(null_phase.info, {})
+
+    def test_local_cache(self):
+        from baseviews.caching import LocalCache
+        local_cache = LocalCache(2)
+        local_cache.set('a', 1, 60)
+        local_cache.set('b', 2, 60)
+        self.assertEqual(local_cache.get('a'), 1)
+
+        # "b" is now the least recently used entry, so it is evicted
+        local_cache.set('c', 3, 60)
+        self.assertEqual(local_cache.get('b'), None)
+        self.assertEqual(local_cache.get('a'), 1)
+        self.assertEqual(local_cache.get('c'), 3)
+
+        local_cache.set('d', 4, -1)
+        self.assertEqual(local_cache.get('d'), None)
+
+    def test_single_flight(self):
+        import threading
+        from baseviews.caching import SingleFlight
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'cheezburger'
+
+        leader = threading.Thread(
+            target=lambda: results.append(flights.do('key', fetch)))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(
+            target=lambda: results.append(flights.do('key', fetch)))
+        follower.start()
+        # Give the follower a chance to join the call in progress
+        time.sleep(0.1)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results),
+                         [('cheezburger', False), ('cheezburger', True)])
+
+    def test_codecs(self):
+        from baseviews.codecs import CompressedPickleCodec, PickleCodec
+        small = {'verb': 'haz', 'noun': 'cheezburger'}
+        large = {'nouns': ['cheezburger'] * 1000}
+
+        codec = CompressedPickleCodec()
+        self.assertEqual(codec.decode(codec.encode(small)), small)
+        self.assertEqual(codec.encode(small)[0], 'r')
+        self.assertEqual(codec.decode(codec.encode(large)), large)
+        self.assertEqual(codec.encode(large)[0], 'z')
+        self.assertTrue(len(codec.encode(large)) <
+                        len(PickleCodec().encode(large)))
+
+    def test_combined_views(self):
+        from baseviews.views import AjaxView, FormView
+
+        # The view classes can be combined without layout conflicts
+        class AjaxFormView(AjaxView, FormView):
+            cache_key = 'lol'
+
+        view = AjaxFormView.new_instance()
+        self.assertEqual(view.timings, None)
+        self.assertEqual(view.selected_fields, None)
+        view.lol = 'cat'
+        self.assertEqual(view.lol, 'cat')
+
+    def test_run_concurrently(self):
+        import sys
+        import threading
+        import traceback
+        from django.utils import translation
+        from baseviews.concurrency import run_concurrently
+        ready = threading.Event()
+
+        # The first call can only see the event set by the second if they
+        # run at the same time.
+        def waiter():
+            ready.wait(5)
+            return ready.is_set()
+
+        def setter():
+            ready.set()
+            return 'ready'
+
+        self.assertEqual(run_concurrently([waiter, setter], 2),
+                         [True, 'ready'])
+        self.assertEqual(run_concurrently([setter], 4), ['ready'])
+
+        def broken():
+            raise ValueError('No cheezburger')
+        self.assertRaises(ValueError, run_concurrently, [setter, broken], 2)
+
+        # The original traceback is kept
+        try:
+            run_concurrently([setter, broken], 2)
+        except ValueError:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        self.assertEqual(frames[-1][2], 'broken')
+
+        # The threads use the caller's language
+        translation.activate('fr')
+        try:
+            self.assertEqual(run_concurrently([translation.get_language] * 2,
+                                              2), ['fr', 'fr'])
+        finally:
+            translation.deactivate()
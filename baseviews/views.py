@@ -1,22 +1,151 @@
+import copy
+import cProfile
+import datetime
+import decimal
+import hashlib
+import logging
+import math
+import os
+import random
+import re
+import time
+import uuid
+from email.utils import mktime_tz, parsedate_tz
+
 from django.conf import settings
 from django.core.cache import cache
-from django.core.serializers.json import DjangoJSONEncoder
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import got_request_exception
+from django.core.urlresolvers import resolve
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.fields.related import ManyToOneRel
+from django.db.models.query import QuerySet
+from django.forms.models import BaseModelForm, BaseModelFormSet
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseNotModified, HttpResponseRedirect,
+                         QueryDict)
 from django.utils import simplejson
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import force_unicode
+from django.utils import translation
+from django.utils.http import http_date
+from django.utils.text import compress_string
 from django.shortcuts import render_to_response
-from django.template import RequestContext
+from django.template import Node, Template, TemplateDoesNotExist, loader
+from django.template.loader_tags import ExtendsNode
+
+from baseviews.caching import (LocalCache, cache_stats, compile_vary_on,
+                               get_class_cache, get_local_cache,
+                               get_tag_version, invalidate_model,
+                               local_flights, model_tag, vary_cache_key,
+                               view_name, watch_models)
+from baseviews.codecs import PickleCodec, get_codec
+from baseviews.concurrency import run_concurrently
+from baseviews.context import (EMPTY, LazyContext, LazyRequestContext,
+                               LazyValue, resolve_lazy)
+from baseviews.forms import CachedFormHTML
+from baseviews.instrumentation import (QueryCounter, Timings,
+                                      get_collectors, null_phase)
+from baseviews.profiling import save_profile, should_profile
+from baseviews.serializers import get_serializer, iter_json
+from baseviews.signals import forms_saved, view_profiled, view_timed
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+logger = logging.getLogger('baseviews')
+NOT_BUILT = object() # Marks a form that hasn't been built yet
+# Form options of these types have a repr that identifies them
+KEY_TYPES = (basestring, bool, int, long, float, decimal.Decimal,
+             datetime.date, datetime.time)
+
+
+class ViewMetaclass(type):
+    """Prepares each view class when it is defined."""
+
+    def __init__(cls, name, bases, attrs):
+        super(ViewMetaclass, cls).__init__(name, bases, attrs)
+        cls.prepare_class()
+
+
+def overrides(view_class, name):
+    """
+    Return True if the view class overrides the named ``BasicView`` method.
+    """
+    # BasicView is the last view class in the MRO.  It is found this way so
+    # that this also works while BasicView itself is being defined.
+    base = [klass for klass in view_class.__mro__
+            if isinstance(klass, ViewMetaclass)][-1]
+    method = getattr(view_class, name)
+    base_method = getattr(base, name)
+    return getattr(method, '__func__', method) is not \
+        getattr(base_method, '__func__', base_method)
 
 
 class BasicView(object):
+    __metaclass__ = ViewMetaclass
     cache_key = None # Leave as none to disable context caching
     cache_time = 60*5 # 5 minutes
+    vary_on = () # Parts of the request that the cache key depends on
+    cache_tags = () # Tags that can be used to invalidate the cache
+    cache_models = () # Invalidate the cache when these models change
+    cache_stale_time = None # Set to serve stale context while regenerating
+    cache_lock_time = 30 # Maximum time one caller may spend regenerating
+    cache_early_refresh = 1.0 # Set to 0 to disable probabilistic refresh
+    context_codec = None # Defaults to the BASEVIEWS_CONTEXT_CODEC setting
+    cache_max_size = 1000*1000 # Largest encoded context, in bytes
+    cache_chunks = False # Set to split larger contexts across several keys
+    negative_cache_time = None # Set to cache Http404 and EMPTY contexts
+    local_cache_size = None # Set to keep up to this many contexts in memory
+    local_cache_time = None # Defaults to, and may not exceed, cache_time
+    cache_response = False # Set to cache the whole rendered response
+    caching_response = False # Set while rendering a response to be cached
+    context_sections = {} # Map section names to their cache times
+    section_workers = 1 # Threads used to generate missing sections
+    cache_template = False # Set to reuse compiled templates between requests
+    template_cache_size = 100 # Compiled templates kept for each view class
     content_type = settings.DEFAULT_CONTENT_TYPE
+    instrument = getattr(settings, 'BASEVIEWS_INSTRUMENT', False)
+    server_timing = getattr(settings, 'BASEVIEWS_SERVER_TIMING', False)
+    # Ways to turn on profiling for a request: a signed header, a query
+    # parameter given by a staff member, or sampling 1 in N requests.
+    profile_header = getattr(settings, 'BASEVIEWS_PROFILE_HEADER', False)
+    profile_param = getattr(settings, 'BASEVIEWS_PROFILE_PARAM', None)
+    profile_sample = getattr(settings, 'BASEVIEWS_PROFILE_SAMPLE', None)
+    timings = None
+    tag_version = None
 
     def __new__(cls, request, *args, **kwargs):
-        instance = object.__new__(cls)
-        if isinstance(instance, cls):
+        instance = cls.new_instance()
+        if cls.profiling and should_profile(cls, request):
+            return instance.run_profiled(request, *args, **kwargs)
+        if not cls.instrument:
             instance.__init__(request, *args, **kwargs)
-        return instance()
+            return instance()
+
+        instance.timings = Timings()
+        with instance.phase('init'):
+            instance.__init__(request, *args, **kwargs)
+        response = instance()
+        instance.report_timings(response)
+        return response
+
+    @classmethod
+    def new_instance(cls):
+        """Create an instance of the view without initializing it."""
+        return object.__new__(cls)
+
+    @classmethod
+    def prepare_class(cls):
+        """
+        Called once when the view class is defined, to work out anything
+        that doesn't need to be looked up again on every request.
+        """
+        cls.vary_on_functions = compile_vary_on(cls.vary_on)
+        cls.profiling = bool(cls.profile_header or cls.profile_param or
+                             cls.profile_sample)
+        cls.overrides_uncached_context = overrides(cls, 'uncached_context')
+        if cls.cache_models:
+            watch_models(cls.cache_models)
 
     def __init__(self, request, *args, **kwargs):
         self.request = request
@@ -25,32 +154,453 @@ class BasicView(object):
 
     def __call__(self):
         """Handle the request processing workflow."""
+        if self.cache_response:
+            return self.get_cached_response()
         return self.render()
 
+    def run_profiled(self, request, *args, **kwargs):
+        """
+        Handle the request under a profiler, with the phases timed, and send
+        the profile to the ``view_profiled`` signal.  It is also saved to the
+        ``BASEVIEWS_PROFILE_DIR`` directory, if that setting is given.
+        """
+        self.timings = Timings()
+
+        def run():
+            with self.phase('init'):
+                self.__init__(request, *args, **kwargs)
+            return self()
+        profiler = cProfile.Profile()
+        response = profiler.runcall(run)
+
+        if self.instrument:
+            self.report_timings(response)
+        directory = getattr(settings, 'BASEVIEWS_PROFILE_DIR', None)
+        if directory:
+            save_profile(self, profiler, directory)
+        view_profiled.send(sender=self.__class__, view=self,
+                           profiler=profiler, response=response)
+        return response
+
+    def phase(self, name, **info):
+        """
+        Return a context manager that times a phase of the view workflow
+        when the view is instrumented, and does nothing otherwise.
+        """
+        if self.timings is None:
+            return null_phase
+        return self.timings.phase(name, **info)
+
+    def report_timings(self, response):
+        """
+        Send the timings of an instrumented view to the ``view_timed``
+        signal and the ``BASEVIEWS_TIMING_COLLECTORS``, and add them to the
+        response as a Server-Timing header if ``server_timing`` is set.
+        """
+        view_timed.send(sender=self.__class__, view=self,
+                        timings=self.timings, response=response)
+        for collector in get_collectors():
+            collector(self, self.timings, response)
+        if self.server_timing:
+            response['Server-Timing'] = self.timings.server_timing()
+
     def get_cache_key(self):
-        """Provide an opportunity to dynamically generate the cache key."""
+        """
+        Provide an opportunity to dynamically generate the cache key.  If
+        ``vary_on`` is set, a hash of those parts of the request is added to
+        the ``cache_key``.
+        """
+        if self.vary_on and self.cache_key is not None:
+            return vary_cache_key(self.cache_key,
+                                  [vary(self) for vary in
+                                   self.vary_on_functions])
         return self.cache_key
 
+    def get_cache_tags(self):
+        """
+        Provide the tags for the cached context, including one for each of
+        the ``cache_models``.
+        """
+        return list(self.cache_tags) + [model_tag(model)
+                                        for model in self.cache_models]
+
+    def version_cache_key(self, cache_key):
+        """
+        Add the current version of the view's cache tags to a cache key, so
+        that invalidating a tag moves the view on to a new key.
+        """
+        if cache_key is None:
+            return None
+        if self.tag_version is None:
+            tags = self.get_cache_tags()
+            if not tags:
+                return cache_key
+            self.tag_version = get_tag_version(tags)
+        return '%s:%s' % (cache_key, self.tag_version)
+
     def get_context(self):
         """
         Retrieve the cached context from the cache if it exists. Otherwise,
         generate it and cache it.
         """
-        cache_key = self.get_cache_key()
+        cache_key = self.version_cache_key(self.get_cache_key())
         if cache_key is None:
-            context_dict = self.cached_context()
-        else:
-            context_dict = cache.get(cache_key)
-            if context_dict is None:
+            with self.phase('cached_context'):
                 context_dict = self.cached_context()
-                cache.set(cache_key, context_dict, self.cache_time)
-        context_dict.update(self.uncached_context())
+        elif self.local_cache_size:
+            context_dict = self.get_local_context(cache_key)
+        else:
+            context_dict = self.fetch_context(cache_key)
+        if context_dict == EMPTY:
+            return self.empty_context()
+        if self.context_sections:
+            with self.phase('sections'):
+                context_dict.update(self.get_section_context())
+        with self.phase('uncached_context'):
+            context_dict.update(self.uncached_context())
+        return context_dict
+
+    def fetch_context(self, cache_key):
+        """
+        Retrieve the context from the cache, generating and caching it if it
+        isn't there.
+        """
+        if self.cache_stale_time is not None:
+            return self.get_stale_context(cache_key)
+        with self.phase('cache_get') as phase:
+            context_dict = self.cache_get(cache_key)
+            if not isinstance(context_dict, dict) and context_dict != EMPTY:
+                # Entries of another shape, such as ones stored while
+                # cache_stale_time was set, are misses.
+                context_dict = None
+            phase.info['hit'] = context_dict is not None
+        name = view_name(self.__class__)
+        if context_dict is None:
+            cache_stats.incr(name, 'misses')
+            context_dict = self.generate_context()
+            self.store_context(cache_key, context_dict)
+        elif context_dict == EMPTY:
+            cache_stats.incr(name, 'negative_hits')
+        else:
+            cache_stats.incr(name, 'hits')
+        return context_dict
+
+    def generate_context(self):
+        """
+        Call ``cached_context``.  If ``negative_cache_time`` is set, an
+        ``Http404`` raised by it is returned as the ``EMPTY`` marker, so that
+        it can be cached.
+        """
+        start = time.time()
+        try:
+            with self.phase('cached_context'):
+                if self.negative_cache_time is None:
+                    return self.cached_context()
+                try:
+                    return self.cached_context()
+                except Http404:
+                    return EMPTY
+        finally:
+            name = view_name(self.__class__)
+            cache_stats.incr(name, 'generations')
+            cache_stats.incr(name, 'generation_time', time.time() - start)
+
+    def empty_context(self):
+        """
+        Called in place of building the rest of the context when the cached
+        context is ``EMPTY``.  Raises ``Http404`` by default.
+        """
+        raise Http404
+
+    def store_context(self, cache_key, context_dict, generation_time=0):
+        """
+        Store the cached context, evaluating any lazy values first.  If
+        ``cache_stale_time`` is set, the time it expires and the time it took
+        to generate are stored with it.
+        """
+        if context_dict == EMPTY:
+            if self.negative_cache_time is not None:
+                with self.phase('cache_set'):
+                    self.cache_set(cache_key, EMPTY, self.negative_cache_time)
+            return
+        resolve_lazy(context_dict)
+        cache_stats.incr(view_name(self.__class__), 'sets')
+        with self.phase('cache_set'):
+            if self.cache_stale_time is None:
+                self.cache_set(cache_key, context_dict, self.cache_time)
+            else:
+                self.cache_set(cache_key, (context_dict,
+                                           time.time() + self.cache_time,
+                                           generation_time),
+                               self.cache_time + self.cache_stale_time)
+
+    def cache_get(self, cache_key):
+        """
+        Retrieve a context entry from the cache, decoding it with the view's
+        ``context_codec`` and joining its chunks if it has any.  Entries that
+        can't be decoded, such as ones cached before the codec was set, are
+        treated as misses.
+        """
+        data = cache.get(cache_key)
+        codec = self.get_context_codec()
+        if is_chunk_header(data):
+            # The entry was split into chunks, under keys made from a token
+            # so that a reader never joins chunks from two different sets.
+            token, count = data[1:]
+            keys = ['%s:%s:%d' % (cache_key, token, i) for i in range(count)]
+            chunks = cache.get_many(keys)
+            if len(chunks) < count:
+                return None
+            data = ''.join([chunks[key] for key in keys])
+            codec = codec or PickleCodec()
+        elif data is None or codec is None:
+            return data
+        elif not isinstance(data, str):
+            return None
+        name = view_name(self.__class__)
+        start = time.time()
+        try:
+            value = codec.decode(data)
+        except Exception:
+            # Anything can go wrong unpickling data that another codec, or
+            # another version of the code, wrote.
+            logger.warning('Could not decode the cached context of %s.',
+                           name, exc_info=True)
+            return None
+        cache_stats.incr(name, 'decodes')
+        cache_stats.incr(name, 'decode_time', time.time() - start)
+        return value
+
+    def cache_set(self, cache_key, value, timeout):
+        """
+        Store a context entry in the cache, encoded with the view's
+        ``context_codec``.  Encoded entries larger than ``cache_max_size`` are
+        split into chunks if ``cache_chunks`` is set, and otherwise aren't
+        cached at all.  Without a codec, entries are given to the cache as
+        they are, and the backend serializes them.
+        """
+        codec = self.get_context_codec()
+        if codec is None:
+            cache.set(cache_key, value, timeout)
+            return
+
+        name = view_name(self.__class__)
+        start = time.time()
+        data = codec.encode(value)
+        cache_stats.incr(name, 'encodes')
+        cache_stats.incr(name, 'encode_time', time.time() - start)
+        cache_stats.incr(name, 'encoded_bytes', len(data))
+        cache_stats.maximum(name, 'max_encoded_bytes', len(data))
+
+        size = self.cache_max_size
+        if len(data) <= size:
+            cache.set(cache_key, data, timeout)
+        elif self.cache_chunks:
+            token = uuid.uuid4().hex[:8]
+            chunks = dict(('%s:%s:%d' % (cache_key, token, i / size),
+                           data[i:i + size])
+                          for i in range(0, len(data), size))
+            cache.set_many(chunks, timeout)
+            cache.set(cache_key, ('chunks', token, len(chunks)), timeout)
+            cache_stats.incr(name, 'chunked')
+        else:
+            # Remove any older entry, so it isn't served in place of this one
+            cache.delete(cache_key)
+            cache_stats.incr(name, 'rejected')
+            logger.warning('Not caching the context of %s: it is %d bytes, '
+                           'and cache_max_size is %d.', name, len(data), size)
+
+    def get_context_codec(self):
+        """
+        Return the codec that contexts are encoded with, or None if they are
+        given to the cache as they are.  ``PickleCodec`` is used if
+        ``cache_chunks`` is set without a ``context_codec``, since chunks
+        have to be encoded.
+        """
+        codec = get_codec(self.context_codec)
+        if codec is None and self.cache_chunks:
+            return PickleCodec()
+        return codec
+
+    def get_local_context(self, cache_key):
+        """
+        Retrieve the context from the in-process cache, falling back to
+        ``fetch_context``.  Concurrent threads that miss on the same key share
+        a single call to ``fetch_context``.
+        """
+        local_cache = get_local_cache(self.__class__)
+        with self.phase('local_cache_get') as phase:
+            context_dict = local_cache.get(cache_key)
+            phase.info['hit'] = context_dict is not None
+        if context_dict is None:
+            context_dict, shared = local_flights.do(
+                cache_key, lambda: self.fetch_context(cache_key))
+            if shared:
+                cache_stats.incr(view_name(self.__class__), 'local_coalesced')
+            elif context_dict != EMPTY:
+                local_cache.set(cache_key, context_dict,
+                                min(self.local_cache_time or self.cache_time,
+                                    self.cache_time))
+            elif self.negative_cache_time is not None:
+                # EMPTY is only kept for as long as it is in the Django cache
+                local_cache.set(cache_key, context_dict,
+                                min(self.local_cache_time or self.cache_time,
+                                    self.negative_cache_time))
+        else:
+            cache_stats.incr(view_name(self.__class__), 'local_hits')
+        if context_dict == EMPTY:
+            return context_dict
+        # Copy the context so the cached dict isn't changed by the update
+        # with the uncached context.
+        return dict(context_dict)
+
+    def get_stale_context(self, cache_key):
+        """
+        Retrieve the cached context, allowing only one caller at a time to
+        regenerate it.  Other callers are served the stale context until the
+        new one is ready.  The context may also be regenerated a little
+        before it expires, with a probability that rises as expiry nears and
+        as ``cached_context`` gets slower.
+        """
+        name = view_name(self.__class__)
+        with self.phase('cache_get') as phase:
+            entry = self.cache_get(cache_key)
+            if entry != EMPTY and not is_stale_entry(entry):
+                # Entries of another shape, such as plain contexts stored
+                # before cache_stale_time was set, are misses.
+                entry = None
+            phase.info['hit'] = entry is not None
+        if entry == EMPTY:
+            # Negative entries simply expire, without being served stale
+            cache_stats.incr(name, 'negative_hits')
+            return entry
+        if entry is not None:
+            context_dict, expires, delta = entry
+            # Probabilistic early expiration (the "XFetch" algorithm)
+            early = -delta * self.cache_early_refresh * \
+                math.log(1.0 - random.random())
+            if time.time() + early < expires:
+                cache_stats.incr(name, 'hits')
+                return context_dict
+
+        lock_key = '%s:lock' % cache_key
+        locked = cache.add(lock_key, True, self.cache_lock_time)
+        if not locked:
+            if entry is not None:
+                cache_stats.incr(name, 'coalesced')
+                cache_stats.incr(name, 'hits')
+                return entry[0]
+            # Nothing to serve while waiting, so regenerate it here as well.
+            cache_stats.incr(name, 'cold_misses')
+
+        try:
+            start = time.time()
+            context_dict = self.generate_context()
+            now = time.time()
+            self.store_context(cache_key, context_dict, now - start)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+        cache_stats.incr(name, 'regenerations')
+        cache_stats.incr(name, 'misses')
+        if entry is not None and now < entry[1]:
+            cache_stats.incr(name, 'early_refreshes')
+        return context_dict
+
+    def get_section_cache_key(self, name):
+        """
+        Provide the cache key for a context section.  If the view has a
+        ``get_<name>_cache_key`` method, it is used instead.
+        """
+        key_method = getattr(self, 'get_%s_cache_key' % name, None)
+        if key_method is not None:
+            return key_method()
+        prefix = self.get_cache_key()
+        if prefix is None:
+            # Views without a cache key still vary their sections on vary_on
+            prefix = vary_cache_key(view_name(self.__class__),
+                                    [vary(self) for vary in
+                                     self.vary_on_functions])
+        return '%s:%s' % (prefix, name)
+
+    def get_section_names(self):
+        """Provide the names of the context sections to retrieve."""
+        return sorted(self.context_sections)
+
+    def get_section_context(self, refresh=False):
+        """
+        Retrieve all of the context sections with a single ``get_many`` call.
+        Sections that weren't cached are generated with their
+        ``<name>_section`` methods, using up to ``section_workers`` threads,
+        and cached with ``set_many``.  If ``refresh`` is True, every section
+        is regenerated.
+        """
+        names = self.get_section_names()
+        keys = dict((name, self.version_cache_key(
+                        self.get_section_cache_key(name)))
+                    for name in names)
+        if refresh:
+            cached = {}
+        else:
+            cached = cache.get_many(keys.values())
+
+        missing = [name for name in names if cached.get(keys[name]) is None]
+        generated = run_concurrently(
+            [getattr(self, '%s_section' % name) for name in missing],
+            self.section_workers)
+
+        missed = {}
+        for name, section in zip(missing, generated):
+            resolve_lazy(section)
+            cached[keys[name]] = section
+            timeout = self.context_sections[name]
+            missed.setdefault(timeout, {})[keys[name]] = section
+
+        context_dict = {}
+        for name in names:
+            context_dict.update(cached[keys[name]])
+
+        # set_many only takes one timeout, so call it once for each
+        for timeout, sections in missed.items():
+            cache.set_many(sections, timeout)
         return context_dict
 
     def cached_context(self):
         """Provide the context that can be cached."""
         return {}
 
+    def refresh_cache(self):
+        """
+        Generate the cached context and any context sections, and store them
+        in the cache, replacing anything that was already there.
+        """
+        cache_key = self.version_cache_key(self.get_cache_key())
+        if cache_key is not None:
+            start = time.time()
+            context_dict = self.generate_context()
+            self.store_context(cache_key, context_dict, time.time() - start)
+        if self.context_sections:
+            self.get_section_context(refresh=True)
+
+    @classmethod
+    def warm_cache(cls, request, *args, **kwargs):
+        """
+        Fill the cache for a request to the view ahead of time, without
+        rendering a response.
+        """
+        instance = cls.new_instance()
+        instance.__init__(request, *args, **kwargs)
+        instance.refresh_cache()
+
+    @classmethod
+    def get_warm_cache_args(cls):
+        """
+        Provide the ``(args, kwargs)`` pairs of URL arguments to warm the
+        cache with.  Return None to let the ``warm_view_cache`` command decide.
+        """
+        return None
+
     def uncached_context(self):
         """Provide the context that should not be cached."""
         return {}
@@ -61,40 +611,647 @@ class BasicView(object):
         """
         return self.template
 
+    def load_template(self, template_name):
+        """
+        Return the compiled template for a template name, or the first one
+        found from a list of names.  Up to ``template_cache_size`` compiled
+        templates are kept on the view class, and when ``DEBUG`` is on they
+        are reloaded if any of their files have changed.
+        """
+        if isinstance(template_name, (list, tuple)):
+            key = tuple(template_name)
+        else:
+            key = template_name
+        templates = get_class_cache(
+            self.__class__, '_template_cache',
+            lambda: LocalCache(self.template_cache_size))
+        entry = templates.get(key)
+        if entry is not None:
+            template, mtimes = entry
+            if not settings.DEBUG or template_mtimes(mtimes) == mtimes:
+                return template
+
+        if isinstance(template_name, (list, tuple)):
+            template = loader.select_template(template_name)
+        else:
+            template = loader.get_template(template_name)
+        if settings.DEBUG:
+            mtimes = template_mtimes(template_files(template))
+            templates.set(key, (template, mtimes), None)
+        else:
+            templates.set(key, (template, None), None)
+        return template
+
+    def get_template_context(self):
+        """
+        Return the context instance the template is rendered with.  A
+        response that is about to be cached gets a plain ``Context``, since a
+        ``RequestContext`` would cache the output of the context processors,
+        such as the user and CSRF token, in a response shared by everyone.
+        """
+        if self.caching_response:
+            return LazyContext()
+        return LazyRequestContext(self.request)
+
     def render(self):
         """Take the context and render it using the template."""
-        return render_to_response(self.get_template(), self.get_context(),
-                                  RequestContext(self.request),
-                                  mimetype=self.content_type)
+        context_dict = self.get_context()
+        with self.phase('render') as phase:
+            if self.cache_template:
+                template = self.load_template(self.get_template())
+                context = self.get_template_context()
+                context.update(context_dict)
+                response = HttpResponse(template.render(context),
+                                        mimetype=self.content_type)
+            else:
+                response = render_to_response(self.get_template(),
+                                              context_dict,
+                                              self.get_template_context(),
+                                              mimetype=self.content_type)
+            if self.timings is not None:
+                # Reading the content joins it, so only do it when timing
+                phase.info['bytes'] = len(response.content)
+        return response
+
+    def get_cached_response(self):
+        """
+        Retrieve the rendered response from the cache if it exists.
+        Otherwise, render it and cache it.  Conditional GET requests that
+        match the cached response receive a 304 Not Modified response.
+
+        Responses are only cached for GET and HEAD requests to views with a
+        cache key and no ``uncached_context``, since that context would
+        otherwise be cached along with the rest of the response.
+        """
+        cache_key = self.version_cache_key(self.get_cache_key())
+        if cache_key is None or \
+                self.request.method not in ('GET', 'HEAD') or \
+                self.overrides_uncached_context:
+            return self.render()
+
+        response_key = '%s:response' % cache_key
+        with self.phase('response_cache_get') as phase:
+            entry = cache.get(response_key)
+            phase.info['hit'] = entry is not None
+        response = None
+        if entry is None:
+            self.caching_response = True
+            try:
+                response = self.render()
+            finally:
+                self.caching_response = False
+            if response.status_code != 200:
+                return response
+            entry = self.get_response_cache_entry(response)
+            cache.set(response_key, entry, self.cache_time)
+
+        etag = self.get_response_etag(entry)
+        if not_modified(self.request, etag, entry['last_modified']):
+            response = HttpResponseNotModified()
+        elif response is None:
+            response = self.get_response_from_cache(entry)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
+
+    def get_response_cache_entry(self, response):
+        """Provide the dict that is cached for a rendered response."""
+        return {'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': '"%s"' % hashlib.md5(response.content).hexdigest(),
+                'last_modified': int(time.time())}
+
+    def get_response_from_cache(self, entry):
+        """Rebuild a response from its cache entry."""
+        return HttpResponse(entry['content'],
+                            content_type=entry['content_type'])
+
+    def get_response_etag(self, entry):
+        """Return the ETag of the response sent for a cache entry."""
+        return entry['etag']
+
+
+def bulk_creatable(model):
+    """
+    Return True if new instances of a model can be created with
+    ``bulk_create``.
+    """
+    return hasattr(model._default_manager, 'bulk_create') and \
+        not model._meta.many_to_many and not model._meta.parents
+
+
+def points_to(model, target):
+    """Return True if a model has a foreign key to the target model."""
+    for field in model._meta.fields:
+        if isinstance(field.rel, ManyToOneRel) and \
+                issubclass(target, field.rel.to):
+            return True
+    return False
+
+
+def form_key_value(value):
+    """
+    Return a version of a form option that can be hashed into a cache key.
+    Model instances are identified by their class and primary key.  Raises
+    ValueError for any other kind of object, since its ``repr`` may be the
+    same for different values.
+    """
+    if value is None or isinstance(value, KEY_TYPES):
+        return value
+    if isinstance(value, Model) and value.pk is not None:
+        return (view_name(value.__class__), value.pk)
+    if isinstance(value, (list, tuple)):
+        return [form_key_value(item) for item in value]
+    if isinstance(value, dict):
+        return sorted([(key, form_key_value(item))
+                       for key, item in value.items()])
+    raise ValueError('Can\'t use %r in a form cache key.' % (value,))
+
+
+def is_stale_entry(entry):
+    """
+    Return True if a cache entry holds a context stored with its expiry time
+    and generation time, as it is when ``cache_stale_time`` is set.
+    """
+    return isinstance(entry, tuple) and len(entry) == 3 and \
+        isinstance(entry[0], dict)
+
+
+def is_chunk_header(data):
+    """Return True if a cache entry is the header of a chunked entry."""
+    return isinstance(data, tuple) and len(data) == 3 and \
+        data[0] == 'chunks'
+
+
+def template_files(template):
+    """
+    Return the paths of the files a template was loaded from, along with
+    those of the templates it extends or includes by name.  Templates only
+    record where they were loaded from when ``TEMPLATE_DEBUG`` is on, in the
+    source of each of their nodes.
+    """
+    paths = set()
+    for node in template.nodelist.get_nodes_by_type(Node):
+        source = getattr(node, 'source', None)
+        if source:
+            paths.add(getattr(source[0], 'name', None))
+        if isinstance(node, ExtendsNode) and node.parent_name:
+            try:
+                parent = loader.get_template(node.parent_name)
+            except TemplateDoesNotExist:
+                continue
+            paths.update(template_files(parent))
+        included = getattr(node, 'template', None)
+        if isinstance(included, Template):
+            paths.update(template_files(included))
+    paths.discard(None)
+    return paths
+
+
+def template_mtimes(paths):
+    """Return a dict of the modification times of the files that exist."""
+    mtimes = {}
+    for path in paths:
+        if os.path.exists(path):
+            mtimes[path] = os.path.getmtime(path)
+    return mtimes
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Return True if the request's conditional headers show that the client
+    already has the response with the given ETag and modification time.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = [value.strip() for value in if_none_match.split(',')]
+        return etag in etags or '*' in etags
+
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since is not None:
+        parsed = parsedate_tz(if_modified_since.split(';')[0])
+        if parsed is not None:
+            return last_modified <= mktime_tz(parsed)
+    return False
 
 
 class AjaxView(BasicView):
     """Returns a response containing the context serialized to Json"""
     content_type = 'application/json'
+    stream = False # Set to encode the context while sending the response
+    stream_chunk_size = 8192
+    serializer = None # Defaults to the BASEVIEWS_SERIALIZER setting
+    gzip_responses = False # Set to compress responses for capable clients
+    gzip_min_length = 512 # Smaller responses aren't worth compressing
+    allowed_fields = None # Set to let clients select these context keys
+    fields_param = 'fields'
+    selected_fields = None
 
     def __call__(self):
         if not self.request.is_ajax():
             raise Http404
-        return super(AjaxView, self).__call__()
+        if self.allowed_fields is not None:
+            try:
+                self.selected_fields = self.get_selected_fields()
+            except ValueError as e:
+                # The unknown field names may not be ASCII
+                return HttpResponseBadRequest(
+                    force_unicode(e),
+                    content_type='text/plain; charset=%s' %
+                    settings.DEFAULT_CHARSET)
+        response = super(AjaxView, self).__call__()
+        if self.gzip_responses:
+            response = self.compress_response(response)
+        return response
+
+    def get_cached_response(self):
+        """
+        Streamed responses are never cached, since caching one would
+        consume its content before it is sent.
+        """
+        if self.stream:
+            return self.render()
+        response = super(AjaxView, self).get_cached_response()
+        if self.gzip_responses:
+            # Not modified responses vary on the encoding too, since their
+            # ETag does.
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
     def render(self):
-        json_data = simplejson.dumps(self.get_context(),
-                                     cls=DjangoJSONEncoder)
+        context_dict = self.get_context()
+        if self.stream:
+            return HttpResponse(iter_json(context_dict,
+                                          chunk_size=self.stream_chunk_size),
+                                content_type=self.content_type)
+        with self.phase('serialize') as phase:
+            json_data = get_serializer(self.serializer).dumps(context_dict)
+            phase.info['bytes'] = len(json_data)
         return HttpResponse(json_data, content_type=self.content_type)
 
+    def get_selected_fields(self):
+        """
+        Return the set of context keys the client asked for, or None if it
+        didn't ask for any.  Raises ValueError if any of them aren't in
+        ``allowed_fields``.
+        """
+        value = self.request.GET.get(self.fields_param)
+        if not value:
+            return None
+        fields = set([field.strip() for field in value.split(',')
+                      if field.strip()])
+        invalid = fields.difference(self.allowed_fields)
+        if invalid:
+            raise ValueError('Unknown fields: %s' % ', '.join(sorted(invalid)))
+        return fields
+
+    def select_fields(self, context_dict):
+        """Return only the selected fields of the context, if any."""
+        if self.selected_fields is None:
+            return context_dict
+        return dict((key, value) for key, value in context_dict.items()
+                    if key in self.selected_fields)
+
+    def get_cache_key(self):
+        """Add the selected fields to the cache key."""
+        cache_key = super(AjaxView, self).get_cache_key()
+        if cache_key is None or self.selected_fields is None:
+            return cache_key
+        return vary_cache_key(cache_key, sorted(self.selected_fields))
+
+    def get_context(self):
+        """Leave out any fields that the client didn't select."""
+        return self.select_fields(super(AjaxView, self).get_context())
+
+    def store_context(self, cache_key, context_dict, generation_time=0):
+        """
+        Leave out any fields that the client didn't select, so that their
+        lazy values aren't evaluated when the context is cached.
+        """
+        if context_dict != EMPTY:
+            context_dict = self.select_fields(context_dict)
+        super(AjaxView, self).store_context(cache_key, context_dict,
+                                            generation_time)
+
+    def get_section_names(self):
+        """
+        Skip the sections that are named after allowed fields which the
+        client didn't select.
+        """
+        names = super(AjaxView, self).get_section_names()
+        if self.selected_fields is None:
+            return names
+        return [name for name in names
+                if name in self.selected_fields or
+                name not in self.allowed_fields]
+
+    def accepts_gzip(self):
+        """Return True if the client accepts gzipped responses."""
+        accept_encoding = self.request.META.get('HTTP_ACCEPT_ENCODING', '')
+        return bool(re_accepts_gzip.search(accept_encoding))
+
+    def compress_response(self, response):
+        """
+        Compress the response content with gzip if the client accepts it and
+        the content is at least ``gzip_min_length`` bytes long.
+        """
+        if self.stream or response.status_code != 200 or \
+                response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.gzip_min_length or \
+                not self.accepts_gzip():
+            return response
+        response.content = compress_string(response.content)
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(response.content))
+        return response
+
+    def get_response_cache_entry(self, response):
+        """Cache the compressed content along with the response."""
+        entry = super(AjaxView, self).get_response_cache_entry(response)
+        if self.gzip_responses and \
+                len(entry['content']) >= self.gzip_min_length:
+            entry['gzip_content'] = compress_string(entry['content'])
+        return entry
+
+    def get_response_from_cache(self, entry):
+        """Use the cached compressed content if the client accepts it."""
+        if not self.sends_gzip(entry):
+            return super(AjaxView, self).get_response_from_cache(entry)
+        response = HttpResponse(entry['gzip_content'],
+                                content_type=entry['content_type'])
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(entry['gzip_content']))
+        return response
+
+    def get_response_etag(self, entry):
+        """
+        Give the compressed response its own ETag, since its content differs
+        from the uncompressed one.
+        """
+        etag = super(AjaxView, self).get_response_etag(entry)
+        if self.sends_gzip(entry):
+            return '%s-gzip"' % etag[:-1]
+        return etag
+
+    def sends_gzip(self, entry):
+        """
+        Return True if the response for a cache entry is sent compressed.
+        """
+        return 'gzip_content' in entry and self.accepts_gzip()
+
+
+class BatchAjaxView(AjaxView):
+    """
+    Runs several Ajax views in one request, and returns their responses
+    together in one JSON object.
+    """
+    batch_param = 'requests'
+    max_batch_size = 20
+    batch_workers = 1 # Threads used to run the views in the batch
+    batch = None
+
+    def __call__(self):
+        if not self.request.is_ajax():
+            raise Http404
+        try:
+            self.batch = self.get_batch()
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e), content_type='text/plain')
+        return super(BatchAjaxView, self).__call__()
+
+    def get_batch(self):
+        """
+        Return the batch as a list of ``(url, params)`` pairs.  It is read as
+        a JSON list from the ``batch_param`` parameter or the body of a POST
+        request, and each item is either a URL, a ``[url, params]`` pair or
+        an object with ``url`` and ``params`` keys.  Raises ValueError if the
+        batch is invalid.
+        """
+        data = self.request.REQUEST.get(self.batch_param)
+        if data is None and self.request.method == 'POST':
+            data = self.request.raw_post_data
+        items = simplejson.loads(data or '[]')
+        if not isinstance(items, list):
+            raise ValueError('The batch must be a list.')
+        if len(items) > self.max_batch_size:
+            raise ValueError('The batch may not have more than %d requests.'
+                             % self.max_batch_size)
+
+        batch = []
+        for item in items:
+            if isinstance(item, basestring):
+                url, params = item, {}
+            elif isinstance(item, dict):
+                url, params = item.get('url'), item.get('params', {})
+            elif isinstance(item, list) and len(item) == 2:
+                url, params = item
+            else:
+                raise ValueError('Invalid batch request: %r' % (item,))
+            if not isinstance(url, basestring) or \
+                    not isinstance(params, dict):
+                raise ValueError('Invalid batch request: %r' % (item,))
+            batch.append((url, params))
+        return batch
+
+    def get_context(self):
+        """Run each of the views in the batch and collect the results."""
+        calls = [lambda url=url, params=params: self.run_view(url, params)
+                 for url, params in self.batch]
+        return {'responses': run_concurrently(calls, self.batch_workers)}
+
+    def run_view(self, url, params):
+        """
+        Resolve the URL to an ``AjaxView`` and call it, returning a dict with
+        the URL, the status code and the decoded response body.
+        """
+        result = {'url': url, 'status': 404, 'body': None}
+        path, sep, query_string = url.partition('?')
+        try:
+            view, args, kwargs = resolve(path)
+        except Http404:
+            return result
+        if not (isinstance(view, type) and issubclass(view, AjaxView)) or \
+                issubclass(view, BatchAjaxView):
+            return result
+
+        request = self.get_view_request(path, query_string, params)
+        try:
+            response = view(request, *args, **kwargs)
+        except Http404:
+            return result
+        except Exception:
+            if settings.DEBUG:
+                raise
+            # Report the error the way Django reports one for a whole request
+            got_request_exception.send(sender=self.__class__,
+                                       request=request)
+            logger.exception('Error running %s in a batch of Ajax views.',
+                             url)
+            result['status'] = 500
+            return result
+
+        result['status'] = response.status_code
+        try:
+            result['body'] = simplejson.loads(response.content)
+        except ValueError:
+            result['body'] = response.content
+        return result
+
+    def get_view_request(self, path, query_string, params):
+        """
+        Build the request for one of the views in the batch.  It is a GET
+        request that copies the batch request's headers and user, so the
+        Ajax check made for the batch applies to each view as well.
+        """
+        request = copy.copy(self.request)
+        request.method = 'GET'
+        request.path = request.path_info = path
+        query = QueryDict(query_string, mutable=True)
+        for key, value in params.items():
+            if isinstance(value, list):
+                query.setlist(key, [force_unicode(item) for item in value])
+            else:
+                query[key] = force_unicode(value)
+        request.GET = query
+        request.POST = QueryDict('')
+        if hasattr(request, '_request'):
+            del request._request
+
+        request.META = dict(self.request.META)
+        request.META.update({'REQUEST_METHOD': 'GET', 'PATH_INFO': path,
+                             'QUERY_STRING': query.urlencode()})
+        # Each view's response is decoded and included in the batch response,
+        # so it shouldn't be compressed or left out as not modified.
+        for header in ('HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH',
+                       'HTTP_IF_MODIFIED_SINCE'):
+            request.META.pop(header, None)
+        return request
+
+
+class StreamingView(BasicView):
+    """
+    Renders the response while it is being sent: the ``template`` first,
+    then the ``item_template`` for each item in the context, a chunk at a
+    time, and finally the ``footer_template``.
+    """
+    item_template = None
+    footer_template = None
+    items_name = 'items' # The context key holding the items to stream
+    item_name = 'item' # The name each item is given in the item template
+    items_per_chunk = 100
+
+    def get_cached_response(self):
+        """
+        Streamed responses are never cached, since caching one would
+        consume its content before it is sent.
+        """
+        return self.render()
+
+    def store_context(self, cache_key, context_dict, generation_time=0):
+        """
+        Refuse to cache the items, which would have to be read into memory
+        all at once to be pickled.
+        """
+        if context_dict != EMPTY and self.items_name in context_dict:
+            raise ImproperlyConfigured(
+                '%s provides %r from cached_context; provide it from '
+                'uncached_context instead.' % (self.__class__.__name__,
+                                               self.items_name))
+        super(StreamingView, self).store_context(cache_key, context_dict,
+                                                 generation_time)
+
+    def render(self):
+        """
+        Render the header and return a response that renders the items as
+        it is sent.  Only the header is timed in the ``render`` phase.
+        """
+        context_dict = self.get_context()
+        with self.phase('render'):
+            items = context_dict.pop(self.items_name, ())
+            context = LazyRequestContext(self.request)
+            context.update(context_dict)
+            header = self.get_compiled_template(
+                self.get_template()).render(context)
+        return HttpResponse(self.iter_render(context, items, header),
+                            mimetype=self.content_type)
+
+    def iter_render(self, context, items, header=None):
+        """
+        Yield the rendered header, the items in chunks of
+        ``items_per_chunk``, and the footer.  Querysets are read with
+        ``iterator()``, so their results aren't all kept in memory.
+        """
+        if header is None:
+            header = self.get_compiled_template(
+                self.get_template()).render(context)
+        yield header
+
+        if isinstance(items, LazyValue):
+            items = items()
+        if isinstance(items, QuerySet):
+            items = items.iterator()
+        item_template = self.get_compiled_template(self.item_template)
+        chunk = []
+        for item in items:
+            context.push()
+            try:
+                context[self.item_name] = item
+                chunk.append(item_template.render(context))
+            finally:
+                context.pop()
+            if len(chunk) >= self.items_per_chunk:
+                yield u''.join(chunk)
+                chunk = []
+        if chunk:
+            yield u''.join(chunk)
+
+        if self.footer_template:
+            footer = self.get_compiled_template(self.footer_template)
+            yield footer.render(context)
+
+    def get_compiled_template(self, template_name):
+        """
+        Return the compiled template, reusing it between requests if
+        ``cache_template`` is set.
+        """
+        if self.cache_template:
+            return self.load_template(template_name)
+        if isinstance(template_name, (list, tuple)):
+            return loader.select_template(template_name)
+        return loader.get_template(template_name)
+
 
 class FormView(BasicView):
+    cache_form_html = False # Set to cache the HTML of unbound forms
+    form_cache_time = 60*60 # 1 hour
+    # The form options that may be used with cache_form_html
+    form_html_options = ('initial', 'prefix', 'auto_id', 'label_suffix')
+    _form = NOT_BUILT
 
     def __init__(self, request, *args, **kwargs):
         super(FormView, self).__init__(request, *args, **kwargs)
         self.data = getattr(self.request, 'POST', None)
         self.files = getattr(self.request, 'FILES', None)
         self.form_options = {}
-        self.form = self.get_form()
+
+    def _get_form(self):
+        if self._form is NOT_BUILT:
+            self._form = self.get_form()
+        return self._form
+
+    def _set_form(self, form):
+        self._form = form
+
+    form = property(_get_form, _set_form, doc="""
+        The form, which is built with ``get_form`` the first time it is used.
+        """)
 
     def __call__(self):
         if self.request.method == 'POST':
-            response = self.process_form()
+            with self.phase('process_form'):
+                response = self.process_form()
             # If a response was returned by the process_form method, then
             # return that response instead of the standard response.
             if response:
@@ -116,7 +1273,39 @@ class FormView(BasicView):
             self.form_options.update({'data': self.data})
         if self.files:
             self.form_options.update({'files': self.files})
-        return self.form_class(**self.form_options)
+        return self.build_form(self.form_class, self.form_options)
+
+    def build_form(self, form_class, options):
+        """
+        Instantiate a form with the given options.  If ``cache_form_html`` is
+        set and the form is unbound, a stand-in is returned that renders the
+        form from cached HTML.
+        """
+        if self.cache_form_html and self.request.method == 'GET' and \
+                'data' not in options and 'files' not in options:
+            cache_key = self.get_form_cache_key(form_class, options)
+            if cache_key is not None:
+                return CachedFormHTML(form_class, options, cache_key,
+                                      self.form_cache_time)
+        return form_class(**options)
+
+    def get_form_cache_key(self, form_class, options):
+        """
+        Provide the cache key for the HTML of an unbound form, based on the
+        form class, the active language and the form options.  Returns None,
+        so the HTML isn't cached, if any of the options aren't listed in
+        ``form_html_options``, since they may vary from request to request.
+        """
+        if set(options).difference(self.form_html_options):
+            return None
+        try:
+            values = sorted([(key, form_key_value(value))
+                             for key, value in options.items()])
+        except ValueError:
+            return None
+        parts = (view_name(form_class), translation.get_language(), values)
+        cache_key = 'baseviews:form:%s' % hashlib.md5(repr(parts)).hexdigest()
+        return self.version_cache_key(cache_key)
 
     def process_form(self):
         """
@@ -134,10 +1323,36 @@ class FormView(BasicView):
 
 
 class MultiFormView(FormView):
+    fail_fast = True # Stop validating at the first invalid form
+    transactional_save = False # Save all of the forms in one transaction
+    bulk_save = False # Create new model instances in bulk where possible
+    save_using = None # The database to save to, if not the default
+    _forms = None
 
-    def __init__(self, request, *args, **kwargs):
-        self.forms = {}
-        super(MultiFormView, self).__init__(request, *args, **kwargs)
+    def _get_forms(self):
+        if self._form is NOT_BUILT:
+            # get_form fills in the forms through this property, so mark
+            # them as built first.
+            self._form = None
+            if self._forms is None:
+                self._forms = {}
+            self._form = self.get_form()
+        return self._forms
+
+    def _set_forms(self, forms):
+        self._forms = forms
+
+    forms = property(_get_forms, _set_forms, doc="""
+        A dict of form names to forms, which are built with ``get_form`` the
+        first time any of them is used.
+        """)
+
+    def _get_form(self):
+        # Building the forms also sets the form
+        self.forms
+        return self._form
+
+    form = property(_get_form, FormView._set_form)
 
     def get_form(self):
         """
@@ -152,21 +1367,118 @@ class MultiFormView(FormView):
             if self.files:
                 self.form_options[form_name].update({'files': self.files})
             self.forms[form_name] = \
-                form_class(**self.form_options[form_name])
+                self.build_form(form_class, self.form_options[form_name])
         return None
 
     def process_form(self):
-        for form_name in self.form_classes.keys():
-            if not self.forms[form_name].is_valid():
-                # Return none so that the normal view processing will
-                # continue, allowing the user to correct errors.
-                return None
+        if not self.validate_forms():
+            # Return none so that the normal view processing will continue,
+            # allowing the user to correct errors.
+            return None
 
         # If all forms are valid, save them and redirect.
-        for form_name in self.form_classes.keys():
-            self.forms[form_name].save()
+        save_forms = self.save_forms
+        if self.transactional_save:
+            save_forms = transaction.commit_on_success(
+                using=self.save_using)(save_forms)
+        if not self.instrument:
+            save_forms()
+            self.report_queries(None)
+            return HttpResponseRedirect(self.get_success_url())
+
+        # Counting the queries needs the connection's debug cursor, so it's
+        # only done for instrumented views.
+        with QueryCounter(self.save_using) as queries:
+            save_forms()
+        self.report_queries(queries.count)
         return HttpResponseRedirect(self.get_success_url())
 
+    def validate_forms(self):
+        """
+        Return True if all of the forms are valid.  Unless ``fail_fast`` is
+        turned off, the forms after the first invalid one aren't validated.
+        """
+        valid = True
+        for form_name in self.form_classes.keys():
+            if not self.forms[form_name].is_valid():
+                valid = False
+                if self.fail_fast:
+                    break
+        return valid
+
+    def save_forms(self):
+        """
+        Save each of the forms.  With ``bulk_save``, the new instances from
+        model forms and formsets are grouped by model and created with one
+        query per model, when the model's manager supports ``bulk_create``
+        and the model has no many-to-many fields or parent models.  Forms
+        for models that other forms' models point to are saved first, one
+        instance at a time, so that the instances pointing to them can be
+        given their primary keys.
+        """
+        if not self.bulk_save:
+            for form_name in self.form_classes.keys():
+                self.forms[form_name].save()
+            return
+
+        forms = [self.forms[form_name]
+                 for form_name in self.form_classes.keys()]
+        models = [self.get_form_model(form) for form in forms]
+        referenced = set([model for model in models if model is not None and
+                          [other for other in models if other is not None and
+                           points_to(other, model)]])
+        for form, model in zip(forms, models):
+            if model in referenced:
+                for instance in self.get_unsaved_instances(form):
+                    instance.save(using=self.save_using)
+                if hasattr(form, 'save_m2m'):
+                    form.save_m2m()
+
+        new_instances = {}
+        for form, model in zip(forms, models):
+            if model in referenced:
+                continue
+            if model is None or not bulk_creatable(model):
+                form.save()
+                continue
+            for instance in self.get_unsaved_instances(form):
+                if instance.pk is None:
+                    new_instances.setdefault(instance.__class__,
+                                             []).append(instance)
+                else:
+                    instance.save(using=self.save_using)
+
+        for model, instances in new_instances.items():
+            model._default_manager.db_manager(self.save_using).bulk_create(
+                instances)
+            # Bulk creates don't send post_save, so invalidate the model's
+            # cache tag here.
+            invalidate_model(model)
+
+    def get_form_model(self, form):
+        """
+        Return the model of a model form or formset, or None for any other
+        kind of form.
+        """
+        if isinstance(form, BaseModelForm):
+            return form._meta.model
+        if isinstance(form, BaseModelFormSet):
+            return form.model
+        return None
+
+    def get_unsaved_instances(self, form):
+        """Return the unsaved instances of a model form or formset."""
+        if isinstance(form, BaseModelForm):
+            return [form.save(commit=False)]
+        return form.save(commit=False)
+
+    def report_queries(self, count):
+        """
+        Called with the number of queries made while saving the forms, and
+        sends the ``forms_saved`` signal.
+        """
+        forms_saved.send(sender=self.__class__, view=self, queries=count)
+
     def uncached_context(self):
         context = super(MultiFormView, self).uncached_context()
         for form_name in self.form_classes.keys():
@@ -16,7 +16,8 @@ setup(
     author_email='brandon@brandonkonkle.com',
     license='License :: OSI Approved :: BSD License',
     url='http://github.com/bkonkle/django-baseviews',
-    packages=['baseviews'],
+    packages=['baseviews', 'baseviews.management',
+              'baseviews.management.commands'],
     classifiers=[
         'Framework :: Django',
         'Intended Audience :: Developers',
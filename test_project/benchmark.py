@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+Measures the per-request overhead of the baseviews classes.
+
+Each scenario calls one of the test project's views directly with a request
+built by a ``RequestFactory``, bypassing the URL resolver and middleware, and
+reports requests per second, latency percentiles, the number of objects
+each request leaves for the garbage collector and, where tracemalloc is
+available, memory allocated per request.  A new request is built for every
+call, outside of the measurements, so that each one parses its own query
+string and body.  Results can be saved and compared against later runs::
+
+    $ python benchmark.py --save baseline.json
+    $ python benchmark.py --compare baseline.json
+"""
+import gc
+import os
+import sys
+import time
+from optparse import OptionParser
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE, '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+
+from django.core.cache import cache
+from django.utils import simplejson
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from baseviews.views import AjaxView, BasicView
+from test_project import views
+from test_project.factory import RequestFactory
+
+
+class CachedLolHome(BasicView):
+    template = views.LolHome.template
+    cache_key = 'benchmark:lol_home'
+
+    def cached_context(self):
+        return {'verb': 'haz', 'noun': 'cheezburger'}
+
+
+class CachedStrongerThanDirt(AjaxView):
+    cache_key = 'benchmark:stronger_than_dirt'
+
+    def cached_context(self):
+        return {'armed': '...with Ajax!'}
+
+
+def clear(key):
+    return lambda: cache.delete(key)
+
+
+factory = RequestFactory()
+ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+kitteh = {'caption': "No, you can't haz a pony."}
+monorail = {'caption': 'Not yours.', 'bark': 'Woof!'}
+
+def get(path, **extra):
+    return lambda: factory.get(path, **extra)
+
+
+def post(path, data):
+    return lambda: factory.post(path, data)
+
+
+# Each scenario is a name, a view, a function that builds a request, and an
+# optional function that runs before every call (outside of the
+# measurements) to set up the cache.
+SCENARIOS = [
+    ('basic:uncached', views.LolHome, get('/lol/'), None),
+    ('basic:cache-hit', CachedLolHome, get('/lol/'), None),
+    ('basic:cache-miss', CachedLolHome, get('/lol/'),
+     clear(CachedLolHome.cache_key)),
+    ('ajax:uncached', views.StrongerThanDirt, get('/ajax/', **ajax), None),
+    ('ajax:cache-hit', CachedStrongerThanDirt, get('/ajax/', **ajax), None),
+    ('ajax:cache-miss', CachedStrongerThanDirt, get('/ajax/', **ajax),
+     clear(CachedStrongerThanDirt.cache_key)),
+    ('form:get', views.KittehView, get('/kitteh/'), None),
+    ('form:post', views.KittehView, post('/kitteh/', kitteh), None),
+    ('multiform:get', views.MonorailCatTicketsView, get('/monorail/'), None),
+    ('multiform:post', views.MonorailCatTicketsView,
+     post('/monorail/', monorail), None),
+]
+
+
+def percentile(sorted_values, percent):
+    index = int(round((len(sorted_values) - 1) * percent / 100.0))
+    return sorted_values[index]
+
+
+def measure_memory(view, make_request, setup, iterations):
+    """
+    Return the average peak number of bytes traced by tracemalloc during
+    each request, or None if tracemalloc isn't available.  Python 2 has no
+    tracemalloc, so only the ``count_objects`` figure is reported there.
+    """
+    if tracemalloc is None:
+        return None
+    total = 0
+    tracemalloc.start()
+    try:
+        for i in range(iterations):
+            if setup:
+                setup()
+            request = make_request()
+            tracemalloc.clear_traces()
+            view(request)
+            total += tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return total / float(iterations)
+
+
+def count_objects(view, make_request, setup, iterations):
+    """
+    Return the average number of objects tracked by the garbage collector
+    that each request leaves behind.  Collection is turned off during each
+    call, so this counts the reference cycles a request creates as well as
+    anything it keeps alive.  It works without tracemalloc, on Python 2.
+    """
+    total = 0
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(iterations):
+            if setup:
+                setup()
+            request = make_request()
+            before = len(gc.get_objects())
+            view(request)
+            total += len(gc.get_objects()) - before
+            gc.collect()
+    finally:
+        if enabled:
+            gc.enable()
+    return total / float(iterations)
+
+
+def run_scenario(view, make_request, setup, iterations, warmup):
+    for i in range(warmup):
+        if setup:
+            setup()
+        view(make_request())
+
+    timings = []
+    for i in range(iterations):
+        if setup:
+            setup()
+        request = make_request()
+        start = time.time()
+        view(request)
+        timings.append(time.time() - start)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'requests_per_second': iterations / total if total else 0.0,
+        'p50': percentile(timings, 50) * 1000,
+        'p90': percentile(timings, 90) * 1000,
+        'p99': percentile(timings, 99) * 1000,
+        'memory': measure_memory(view, make_request, setup,
+                                 max(1, iterations // 10)),
+        'objects': count_objects(view, make_request, setup,
+                                 max(1, iterations // 10)),
+    }
+
+
+def report(results, baseline, threshold):
+    """Print the results, and return the names of regressed scenarios."""
+    print('%-20s %10s %9s %9s %9s %9s %11s' % ('scenario', 'req/s', 'p50 ms',
+                                              'p90 ms', 'p99 ms', 'objs/req',
+                                              'bytes/req'))
+    regressions = []
+    for name, view, make_request, setup in SCENARIOS:
+        if name not in results:
+            continue
+        result = results[name]
+        if result['memory'] is None:
+            memory = '-'
+        else:
+            memory = '%.0f' % result['memory']
+        line = '%-20s %10.0f %9.3f %9.3f %9.3f %9.1f %11s' % (
+            name, result['requests_per_second'], result['p50'],
+            result['p90'], result['p99'], result['objects'], memory)
+        if baseline and name in baseline:
+            change = (result['p50'] - baseline[name]['p50']) / \
+                baseline[name]['p50'] * 100
+            line += '  p50 %+.1f%%' % change
+            if change > threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [scenario ...]')
+    parser.add_option('-n', '--iterations', type='int', default=2000,
+                      help='Requests to measure for each scenario.')
+    parser.add_option('-w', '--warmup', type='int', default=200,
+                      help='Requests to make before measuring.')
+    parser.add_option('--save', metavar='FILE',
+                      help='Save the results as a baseline.')
+    parser.add_option('--compare', metavar='FILE',
+                      help='Compare the results against a saved baseline.')
+    parser.add_option('--threshold', type='float', default=10.0,
+                      help='Percentage slowdown in p50 latency that counts '
+                           'as a regression.')
+    options, selected = parser.parse_args()
+
+    baseline = None
+    if options.compare:
+        baseline = simplejson.load(open(options.compare))
+
+    results = {}
+    for name, view, make_request, setup in SCENARIOS:
+        if selected and name not in selected:
+            continue
+        results[name] = run_scenario(view, make_request, setup,
+                                     options.iterations, options.warmup)
+    regressions = report(results, baseline, options.threshold)
+
+    if options.save:
+        simplejson.dump(results, open(options.save, 'w'), indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
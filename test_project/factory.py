@@ -0,0 +1,47 @@
+"""
+Builds requests for calling views directly, in the tests and benchmarks.
+"""
+import sys
+
+try:
+    from django.test.client import RequestFactory
+except ImportError:
+    # Django versions before 1.3 don't provide a RequestFactory, so build
+    # requests from a WSGI environment the same way the test client does.
+    from StringIO import StringIO
+    from django.core.handlers.wsgi import WSGIRequest
+    from django.test.client import (BOUNDARY, MULTIPART_CONTENT,
+                                    encode_multipart)
+    from django.utils.http import urlencode
+
+    class RequestFactory(object):
+
+        def request(self, method, path, query_string='', body='', **extra):
+            environ = {
+                'PATH_INFO': path,
+                'QUERY_STRING': query_string,
+                'REMOTE_ADDR': '127.0.0.1',
+                'REQUEST_METHOD': method,
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': StringIO(body),
+                'wsgi.errors': sys.stderr,
+                'wsgi.multiprocess': True,
+                'wsgi.multithread': False,
+                'wsgi.run_once': False,
+            }
+            environ.update(extra)
+            return WSGIRequest(environ)
+
+        def get(self, path, data={}, **extra):
+            return self.request('GET', path, urlencode(data), **extra)
+
+        def post(self, path, data={}, **extra):
+            body = encode_multipart(BOUNDARY, data)
+            return self.request('POST', path, body=body,
+                                CONTENT_TYPE=MULTIPART_CONTENT, **extra)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+"""
+Measures throughput and tail latency of the test project under concurrency.
+
+The project is served by a local multi-threaded or multi-process WSGI
+server, and a pool of client threads sends a weighted mix of requests to
+``/lol/``, ``/ajax/``, ``/kitteh/`` and ``/monorail/``.  Each request to a
+cached view misses the cache with the given probability, by varying its
+cache key, so hit and miss ratios can be chosen.  Nothing leaves the
+machine, and the locmem or file-based cache is used::
+
+    $ python loadtest.py --concurrency=16 --requests=5000
+    $ python loadtest.py --processes=4 --cache=file --miss-ratio=0.1
+    $ python loadtest.py --mix=lol:5,ajax:3,kitteh-post:1
+"""
+import httplib
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from multiprocessing import Process
+from optparse import OptionParser
+from SocketServer import ThreadingMixIn
+from urllib import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE, '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+
+ajax = {'X-Requested-With': 'XMLHttpRequest'}
+form = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+# Each kind of request is a method, a path, a body, headers, and whether the
+# view caches its context, so that a miss can be forced.
+REQUESTS = {
+    'lol': ('GET', '/lol/', None, {}, True),
+    'ajax': ('GET', '/ajax/', None, ajax, True),
+    'kitteh': ('GET', '/kitteh/', None, {}, False),
+    'kitteh-post': ('POST', '/kitteh/',
+                    urlencode({'caption': "No, you can't haz a pony."}),
+                    form, False),
+    'monorail': ('GET', '/monorail/', None, {}, False),
+    'monorail-post': ('POST', '/monorail/',
+                      urlencode({'caption': 'Not yours.', 'bark': 'Woof!'}),
+                      form, False),
+}
+DEFAULT_MIX = 'lol:4,ajax:3,kitteh:2,monorail:1'
+
+
+def configure(cache):
+    """
+    Point Django at this module's URLconf and the chosen cache.  This has to
+    happen before anything imports the cache.
+    """
+    from django.conf import settings
+    settings.ROOT_URLCONF = 'test_project.loadtest'
+    settings.DEBUG = settings.TEMPLATE_DEBUG = False
+    if cache == 'file':
+        directory = tempfile.mkdtemp(prefix='baseviews-loadtest-')
+        settings.CACHE_BACKEND = 'file://%s' % directory
+    else:
+        settings.CACHE_BACKEND = 'locmem://'
+
+
+def get_urlpatterns():
+    from django.conf.urls.defaults import patterns, url
+    from baseviews.views import AjaxView, BasicView
+    from test_project import views
+
+    class CachedLolHome(BasicView):
+        template = views.LolHome.template
+        cache_key = 'loadtest:lol_home'
+        vary_on = ('get:miss',)
+
+        def cached_context(self):
+            return {'verb': 'haz', 'noun': 'cheezburger'}
+
+    class CachedStrongerThanDirt(AjaxView):
+        cache_key = 'loadtest:stronger_than_dirt'
+        vary_on = ('get:miss',)
+
+        def cached_context(self):
+            return {'armed': '...with Ajax!'}
+
+    return patterns('',
+        url(r'^lol/$', CachedLolHome),
+        url(r'^ajax/$', CachedStrongerThanDirt),
+        url(r'^kitteh/$', views.KittehView),
+        url(r'^monorail/$', views.MonorailCatTicketsView),
+    )
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(server):
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def start_server(processes):
+    """
+    Start serving the project on a free local port, using threads, or the
+    given number of processes sharing one listening socket.  Returns the
+    port and a function that stops the server.
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+    server = ThreadingWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(WSGIHandler())
+    port = server.server_address[1]
+
+    if not processes:
+        thread = threading.Thread(target=serve, args=(server,))
+        thread.daemon = True
+        thread.start()
+        return port, server.shutdown
+
+    workers = [Process(target=serve, args=(server,))
+               for i in range(processes)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    def stop():
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        server.server_close()
+    return port, stop
+
+
+def parse_mix(value):
+    """Turn ``"lol:4,ajax:1"`` into a list of request names to pick from."""
+    choices = []
+    for item in value.split(','):
+        name, sep, weight = item.strip().partition(':')
+        if name not in REQUESTS:
+            raise ValueError('Unknown request %r, choose from %s' %
+                             (name, ', '.join(sorted(REQUESTS))))
+        choices.extend([name] * int(weight or 1))
+    return choices
+
+
+def send(port, name, miss_ratio):
+    """Make one request, returning its latency and whether it failed."""
+    method, path, body, headers, cached = REQUESTS[name]
+    if cached:
+        if random.random() < miss_ratio:
+            path += '?miss=%s' % uuid.uuid4().hex
+        else:
+            path += '?miss=0'
+    connection = httplib.HTTPConnection('127.0.0.1', port, timeout=30)
+    start = time.time()
+    try:
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        failed = response.status >= 400
+    except (socket.error, httplib.HTTPException):
+        failed = True
+    finally:
+        connection.close()
+    return time.time() - start, failed
+
+
+def run_clients(port, choices, count, options):
+    """
+    Send ``count`` requests from ``concurrency`` threads, and return the
+    results for each kind of request with the time taken.
+    """
+    results = dict((name, []) for name in set(choices))
+    lock = threading.Lock()
+    remaining = [count]
+
+    def client():
+        while True:
+            lock.acquire()
+            try:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            finally:
+                lock.release()
+            name = random.choice(choices)
+            result = send(port, name, options.miss_ratio)
+            lock.acquire()
+            try:
+                results[name].append(result)
+            finally:
+                lock.release()
+
+    threads = [threading.Thread(target=client)
+               for i in range(options.concurrency)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.time() - start
+
+
+def percentile(sorted_values, percent):
+    index = int(round((len(sorted_values) - 1) * percent / 100.0))
+    return sorted_values[index]
+
+
+def report(results, elapsed):
+    print('%-15s %8s %8s %9s %9s %9s %8s' % ('request', 'count', 'req/s',
+                                             'p50 ms', 'p95 ms', 'p99 ms',
+                                             'errors'))
+    everything = []
+    for name in sorted(results) + ['total']:
+        if name == 'total':
+            measured = everything
+        else:
+            measured = results[name]
+            everything.extend(measured)
+        if not measured:
+            continue
+        latencies = sorted([latency for latency, failed in measured])
+        errors = len([failed for latency, failed in measured if failed])
+        print('%-15s %8d %8.0f %9.2f %9.2f %9.2f %7.1f%%' % (
+            name, len(measured), len(measured) / elapsed,
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 95) * 1000,
+            percentile(latencies, 99) * 1000,
+            errors * 100.0 / len(measured)))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-c', '--concurrency', type='int', default=8,
+                      help='Client threads sending requests at once.')
+    parser.add_option('-n', '--requests', type='int', default=2000,
+                      help='Requests to measure.')
+    parser.add_option('-w', '--warmup', type='int', default=200,
+                      help='Requests to send before measuring.')
+    parser.add_option('--mix', default=DEFAULT_MIX,
+                      help='Weighted request names, such as "%s".  The '
+                           'names are %s.' % (DEFAULT_MIX,
+                                              ', '.join(sorted(REQUESTS))))
+    parser.add_option('--miss-ratio', type='float', default=0.0,
+                      help='The fraction of requests to cached views that '
+                           'miss the cache.')
+    parser.add_option('--processes', type='int', default=0,
+                      help='Serve with this many processes instead of '
+                           'threads.')
+    parser.add_option('--cache', choices=['locmem', 'file'],
+                      default='locmem',
+                      help='The cache backend, "locmem" or "file".  Use '
+                           '"file" to share the cache between processes.')
+    options, args = parser.parse_args()
+    try:
+        choices = parse_mix(options.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    configure(options.cache)
+    port, stop = start_server(options.processes)
+    try:
+        run_clients(port, choices, options.warmup, options)
+        results, elapsed = run_clients(port, choices, options.requests,
+                                       options)
+    finally:
+        stop()
+    report(results, elapsed)
+    if sum([failed for measured in results.values()
+            for latency, failed in measured]):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+else:
+    # Imported by Django as the URLconf, after configure has run
+    urlpatterns = get_urlpatterns()
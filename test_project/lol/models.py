@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class Cheezburger(models.Model):
+    name = models.CharField(max_length=50)
+    times_saved = 0
+
+    def save(self, *args, **kwargs):
+        Cheezburger.times_saved += 1
+        super(Cheezburger, self).save(*args, **kwargs)
+
+
+class Bucket(models.Model):
+    burger = models.ForeignKey(Cheezburger)
+    name = models.CharField(max_length=50)
@@ -23,6 +23,8 @@ DATABASES = {
     }
 }
 
+CACHE_BACKEND = 'locmem://'
+
 # Local time zone for this installation. Choices can be found here:
 # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
 # although not all choices may be available on all operating systems.
@@ -82,4 +84,5 @@ TEMPLATE_DIRS = (
 
 INSTALLED_APPS = (
     'baseviews',
+    'test_project.lol',
 )
@@ -2,7 +2,29 @@ from django.conf.urls.defaults import *
 
 urlpatterns = patterns('test_project.views',
     url(r'^lol/$', 'LolHome'),
+    url(r'^stale/$', 'StaleCheezburger'),
+    url(r'^local/$', 'LocalCheezburger'),
+    url(r'^cached/$', 'CachedCheezburger'),
+    url(r'^encoded/$', 'EncodedCheezburger'),
+    url(r'^missing/(?P<noun>\w+)/$', 'MissingCheezburger'),
+    url(r'^sectioned/$', 'SectionedCheezburger'),
+    url(r'^compiled/$', 'CompiledCheezburger'),
+    url(r'^timed/$', 'TimedCheezburger'),
+    url(r'^profiled/$', 'ProfiledCheezburger'),
+    url(r'^tagged/$', 'TaggedCheezburger'),
+    url(r'^varied/$', 'VariedCheezburger'),
+    url(r'^lazy/$', 'LazyCheezburgers'),
+    url(r'^streaming/$', 'StreamingCheezburgers'),
+    url(r'^ajax/lazy/$', 'LazyDirt'),
+    url(r'^ajax/selective/$', 'SelectiveDirt'),
     url(r'^ajax/$', 'StrongerThanDirt'),
+    url(r'^ajax/stream/$', 'StreamingDirt'),
+    url(r'^ajax/stream/cached/$', 'CachedStreamingDirt'),
+    url(r'^ajax/gzip/$', 'CompressedDirt'),
+    url(r'^ajax/broken/$', 'BrokenDirt'),
+    url(r'^ajax/batch/$', 'DirtBatch'),
     url(r'^kitteh/$', 'KittehView'),
+    url(r'^kitteh/cached/$', 'CachedKittehView'),
     url(r'^monorail/$', 'MonorailCatTicketsView'),
+    url(r'^monorail/transactional/$', 'TransactionalMonorailView'),
 )
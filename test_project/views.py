@@ -1,5 +1,11 @@
 from django import forms
-from baseviews.views import BasicView, AjaxView, FormView, MultiFormView
+from django.forms.models import inlineformset_factory, modelformset_factory
+from django.http import Http404
+from django.utils.datastructures import SortedDict
+from baseviews.context import EMPTY, LazyValue
+from baseviews.views import (BasicView, AjaxView, BatchAjaxView, FormView,
+                             MultiFormView, StreamingView)
+from test_project.lol.models import Bucket, Cheezburger
 
 
 class LolHome(BasicView):
@@ -9,12 +15,219 @@ class LolHome(BasicView):
         return {'verb': 'haz', 'noun': 'cheezburger'}
 
 
+class StaleCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'stale_cheezburger'
+    cache_stale_time = 60
+
+    def cached_context(self):
+        return {'verb': 'haz', 'noun': 'fresh cheezburger'}
+
+
+class LocalCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'local_cheezburger'
+    local_cache_size = 10
+
+    def cached_context(self):
+        return {'verb': 'haz', 'noun': 'local cheezburger'}
+
+
+class CachedCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'cached_cheezburger'
+    cache_response = True
+    times_rendered = 0
+
+    def cached_context(self):
+        CachedCheezburger.times_rendered += 1
+        return {'verb': 'haz', 'noun': 'cached cheezburger'}
+
+
+class EncodedCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'encoded_cheezburger'
+    context_codec = 'baseviews.codecs.PickleCodec'
+    cache_max_size = 16
+    cache_chunks = True
+
+    def cached_context(self):
+        return {'verb': 'haz', 'noun': 'encoded cheezburger'}
+
+
+class MissingCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'missing_cheezburger'
+    vary_on = ('kwarg:noun',)
+    negative_cache_time = 60
+    times_generated = 0
+
+    def cached_context(self):
+        MissingCheezburger.times_generated += 1
+        if self.kwargs['noun'] == 'bucket':
+            raise Http404
+        if self.kwargs['noun'] == 'nothing':
+            return EMPTY
+        return {'verb': 'haz', 'noun': self.kwargs['noun']}
+
+
+class SectionedCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'sectioned_cheezburger'
+    context_sections = {'verb': 60, 'noun': 60*60}
+    section_workers = 2
+    sections_generated = []
+
+    def verb_section(self):
+        SectionedCheezburger.sections_generated.append('verb')
+        return {'verb': 'haz'}
+
+    def noun_section(self):
+        SectionedCheezburger.sections_generated.append('noun')
+        return {'noun': 'sectioned cheezburger'}
+
+
+class CompiledCheezburger(BasicView):
+    cache_template = True
+
+    def get_template(self):
+        return ['lol/missing.html', 'home.html']
+
+    def get_context(self):
+        return {'verb': 'haz', 'noun': 'compiled cheezburger'}
+
+
+class TimedCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'timed_cheezburger'
+    instrument = True
+    server_timing = True
+
+    def cached_context(self):
+        return {'verb': 'haz', 'noun': 'timed cheezburger'}
+
+
+class ProfiledCheezburger(BasicView):
+    template = 'home.html'
+    profile_header = True
+
+    def get_context(self):
+        return {'verb': 'haz', 'noun': 'profiled cheezburger'}
+
+
+class TaggedCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'tagged_cheezburger'
+    cache_time = 60*60*24
+    cache_tags = ('burgers',)
+    cache_models = ('lol.Cheezburger',)
+    times_generated = 0
+
+    def cached_context(self):
+        TaggedCheezburger.times_generated += 1
+        return {'verb': 'haz', 'noun': 'tagged cheezburger'}
+
+
+class VariedCheezburger(BasicView):
+    template = 'home.html'
+    cache_key = 'varied_cheezburger'
+    vary_on = ('get:noun', 'user', 'header:Accept-Language')
+    times_generated = 0
+
+    def cached_context(self):
+        VariedCheezburger.times_generated += 1
+        return {'verb': 'haz', 'noun': self.request.GET.get('noun')}
+
+
+def count_burgers():
+    LazyCheezburgers.times_counted += 1
+    return 3
+
+
+class LazyCheezburgers(BasicView):
+    template = 'lazy.html'
+    times_counted = 0
+
+    def get_context(self):
+        return {'show': 'show' in self.request.GET,
+                'burgers': LazyValue(count_burgers)}
+
+
+class LazyDirt(AjaxView):
+    cache_key = 'lazy_dirt'
+
+    def cached_context(self):
+        return {'burgers': LazyValue(count_burgers)}
+
+
+class SelectiveDirt(AjaxView):
+    cache_key = 'selective_dirt'
+    allowed_fields = ('armed', 'burgers')
+
+    def cached_context(self):
+        return {'armed': '...with Ajax!', 'burgers': LazyValue(count_burgers)}
+
+
+class StreamingCheezburgers(StreamingView):
+    template = 'burgers_header.html'
+    item_template = 'burgers_item.html'
+    footer_template = 'burgers_footer.html'
+    items_per_chunk = 2
+    burgers_made = 0
+
+    def cached_context(self):
+        return {'verb': 'cheezburgers'}
+
+    def uncached_context(self):
+        return {'items': self.make_burgers()}
+
+    def make_burgers(self):
+        for i in range(5):
+            StreamingCheezburgers.burgers_made += 1
+            yield 'cheezburger %d' % i
+
+
 class StrongerThanDirt(AjaxView):
 
     def get_context(self):
         return {'armed': '...with Ajax!'}
 
 
+class StreamingDirt(AjaxView):
+    stream = True
+    stream_chunk_size = 16
+
+    def get_context(self):
+        return {'armed': '...with Ajax!',
+                'rounds': (i * i for i in range(100))}
+
+
+class BrokenDirt(AjaxView):
+
+    def get_context(self):
+        raise ValueError('No dirt')
+
+
+class CachedStreamingDirt(StreamingDirt):
+    cache_key = 'streaming_dirt'
+    cache_response = True
+
+
+class CompressedDirt(AjaxView):
+    cache_key = 'compressed_dirt'
+    cache_response = True
+    gzip_responses = True
+    gzip_min_length = 64
+    serializer = 'baseviews.serializers.FastJSONSerializer'
+
+    def cached_context(self):
+        return {'armed': ['...with Ajax!'] * 20}
+
+
+class DirtBatch(BatchAjaxView):
+    batch_workers = 2
+
+
 class KittehForm(forms.Form):
     caption = forms.CharField()
 
@@ -28,6 +241,19 @@ class KittehView(FormView):
     success_url = '/pewpewpew/'
 
 
+class CountedKittehForm(KittehForm):
+    instances = 0
+
+    def __init__(self, *args, **kwargs):
+        CountedKittehForm.instances += 1
+        super(CountedKittehForm, self).__init__(*args, **kwargs)
+
+
+class CachedKittehView(KittehView):
+    form_class = CountedKittehForm
+    cache_form_html = True
+
+
 class GoggieForm(forms.Form):
     bark = forms.CharField()
 
@@ -40,3 +266,61 @@ class MonorailCatTicketsView(MultiFormView):
     form_classes = {'kitteh_form': KittehForm,
                     'goggie_form': GoggieForm}
     success_url = '/derailed/'
+
+
+class TransactionalMonorailView(MonorailCatTicketsView):
+    fail_fast = False
+    transactional_save = True
+    bulk_save = True
+    instrument = True
+
+
+class CheezburgerForm(forms.ModelForm):
+
+    class Meta:
+        model = Cheezburger
+
+
+CheezburgerFormSet = modelformset_factory(Cheezburger, extra=2)
+
+
+class BulkCheezburgerView(MultiFormView):
+    template = 'monorail.html'
+    form_classes = SortedDict([('burger_form', CheezburgerForm),
+                               ('burger_formset', CheezburgerFormSet)])
+    transactional_save = True
+    bulk_save = True
+    instrument = True
+    success_url = '/nom/'
+
+
+BucketFormSet = inlineformset_factory(Cheezburger, Bucket, extra=2)
+
+
+class BulkBucketView(MultiFormView):
+    template = 'monorail.html'
+    form_classes = SortedDict([('bucket_formset', BucketFormSet),
+                               ('burger_form', CheezburgerForm)])
+    bulk_save = True
+
+    def get_form(self):
+        super(BulkBucketView, self).get_form()
+        # The buckets belong to the new burger
+        self.forms['bucket_formset'] = self.build_form(
+            BucketFormSet, dict(self.form_options['bucket_formset'],
+                                instance=self.forms['burger_form'].instance))
+        return None
+
+    def get_success_url(self):
+        return '/nom/%d/' % self.forms['burger_form'].instance.pk
+
+
+class BrokenForm(forms.Form):
+
+    def save(self):
+        raise ValueError('No cheezburger')
+
+
+class BrokenCheezburgerView(BulkCheezburgerView):
+    form_classes = SortedDict([('burger_form', CheezburgerForm),
+                               ('broken_form', BrokenForm)])